@@ -0,0 +1,71 @@
+"""Замер времени stitch_images на синтетической папке изображений.
+
+Режим 'quality' повторяет прежнее поведение (полное декодирование + LANCZOS),
+поэтому его время служит точкой отсчета "до" для 'balanced' и 'fast'.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_stitch.py --count 20 --width 3000 --height 2000 --output-width 1200
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import image_scraper
+from fake_site import generate_image
+
+
+def make_folder(root, count, width, height, image_format='JPEG'):
+    """Создает папку с count синтетическими изображениями width x height."""
+    folder = os.path.join(root, 'bench_page')
+    os.makedirs(folder, exist_ok=True)
+    ext = 'jpeg' if image_format == 'JPEG' else image_format.lower()
+    for i in range(count):
+        generate_image(width, height, seed=i).save(os.path.join(folder, f"image_{i+1}.{ext}"), image_format, quality=90)
+    return folder
+
+
+def time_stitch(folder, repeats, **kwargs):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            image_scraper.stitch_images(folder, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарк stitch_images по режимам масштабирования")
+    parser.add_argument('--count', type=int, default=20, help="Изображений в папке")
+    parser.add_argument('--width', type=int, default=3000)
+    parser.add_argument('--height', type=int, default=2000)
+    parser.add_argument('--output-width', type=int, default=1200, help="max_output_width (0 - без уменьшения)")
+    parser.add_argument('--repeats', type=int, default=3, help="Повторов, берется лучшее время")
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix='bench_stitch_')
+    try:
+        folder = make_folder(root, args.count, args.width, args.height)
+        print(f"Папка: {args.count} изображений {args.width}x{args.height}, "
+              f"ширина результата: {args.output_width or 'как у исходных'}")
+        baseline = None
+        for mode in image_scraper.RESAMPLE_MODES:
+            elapsed = time_stitch(folder, args.repeats, resample_mode=mode,
+                                  max_output_width=args.output_width or None)
+            baseline = baseline or elapsed
+            print(f"  {mode:<9} {elapsed:7.2f} с  ({baseline / elapsed:4.1f}x относительно 'quality')")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
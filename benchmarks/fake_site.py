@@ -0,0 +1,131 @@
+"""Локальный сайт со слайдерами div#masterslider_div для офлайн-бенчмарков.
+
+Страницы /page/<n>/ содержат слайдер из images_per_page изображений
+/img/<n>/<i>.<ext>, сгенерированных заранее в памяти. Ответы с изображениями
+отдают ETag и понимают If-None-Match, поэтому повторный запуск проверяет
+и работу кеша. В режиме render='js' теги <img> создаются скриптом, как на
+сайтах, где нужен браузер.
+"""
+import hashlib
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image, ImageDraw
+
+_CONTENT_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp', 'GIF': 'image/gif'}
+_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+
+
+def generate_image(width, height, seed=0):
+    """Синтетическое изображение с градиентом и шумом (сжимается примерно как фото)."""
+    noise = Image.effect_noise((width, height), 40).convert('RGB')
+    img = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    img = Image.blend(img, noise, 0.3)
+    ImageDraw.Draw(img).rectangle([width // 4, height // 4, width // 2, height // 2],
+                                  fill=(seed * 37 % 255, seed * 91 % 255, 160))
+    return img
+
+
+def encode_image(img, image_format='JPEG'):
+    buffer = io.BytesIO()
+    if image_format in ('JPEG', 'WEBP'):
+        img.save(buffer, image_format, quality=90)
+    else:
+        img.save(buffer, image_format)
+    return buffer.getvalue()
+
+
+class FakeSliderSite:
+    """HTTP-сервер со страницами-слайдерами на 127.0.0.1 (порт выбирается свободный)."""
+
+    def __init__(self, pages=10, images_per_page=8, width=1600, height=900, image_format='JPEG',
+                 render='static', unique_images=8):
+        self.pages = pages
+        self.images_per_page = images_per_page
+        self.image_format = image_format.upper()
+        self.render = render
+        self.ext = _EXTENSIONS[self.image_format]
+        # Несколько разных изображений на весь сайт: генерация больших картинок дорогая
+        self._bodies = [encode_image(generate_image(width, height, seed), self.image_format)
+                        for seed in range(max(1, unique_images))]
+        self._etags = [f'"{hashlib.sha1(body).hexdigest()}"' for body in self._bodies]
+        self.bytes_per_page = sum(len(self._body_for(0, i)[0]) for i in range(images_per_page))
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def page_urls(self):
+        return [f"{self.base_url}/page/{n}/" for n in range(self.pages)]
+
+    def _body_for(self, page, index):
+        slot = (page * self.images_per_page + index) % len(self._bodies)
+        return self._bodies[slot], self._etags[slot]
+
+    def _page_html(self, page):
+        srcs = [f"/img/{page}/{i}.{self.ext}" for i in range(self.images_per_page)]
+        if self.render == 'js':
+            return ('<html><body><div id="masterslider_div"></div><script>'
+                    'var d=document.getElementById("masterslider_div");'
+                    f'{srcs!r}.forEach(function(s){{var i=document.createElement("img");i.src=s;d.appendChild(i);}});'
+                    '</script></body></html>')
+        tags = ''.join(f'<img src="{src}" alt="">' for src in srcs)
+        return f'<html><body><div id="masterslider_div">{tags}</div></body></html>'
+
+    def _make_handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1' # keep-alive, как у настоящего сервера
+
+            def log_message(self, format, *args):
+                pass # Не засоряем вывод бенчмарка
+
+            def _send(self, status, body=b'', content_type='text/html; charset=utf-8', headers=None):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if body:
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                parts = [p for p in self.path.split('?')[0].split('/') if p]
+                try:
+                    if len(parts) == 2 and parts[0] == 'page':
+                        self._send(200, site._page_html(int(parts[1])).encode('utf-8'))
+                        return
+                    if len(parts) == 3 and parts[0] == 'img':
+                        body, etag = site._body_for(int(parts[1]), int(parts[2].split('.')[0]))
+                        if self.headers.get('If-None-Match') == etag:
+                            self._send(304, headers={'ETag': etag})
+                        else:
+                            self._send(200, body, _CONTENT_TYPES[site.image_format], {'ETag': etag})
+                        return
+                except ValueError:
+                    pass
+                self._send(404, b'not found')
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-slider-site', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,204 @@
+"""Офлайн-бенчмарки загрузки и склейки на локальном сайте FakeSliderSite.
+
+Замеряются download_images (страницы/мин, МБ/с), stitch_images
+(папки/мин) и run_scraping целиком (холодный и повторный запуск, с разбивкой
+по этапам из run_report.json). Каждый замер идет в отдельном процессе, чтобы
+пиковый RSS относился только к нему.
+
+Запуск из корня репозитория:
+    python benchmarks/run_benchmarks.py --pages 20 --images 8 --output bench.json
+    python benchmarks/run_benchmarks.py --baseline bench.json --tolerance 0.2
+
+С --baseline скрипт завершается с кодом 1, если пропускная способность
+любого замера упала больше чем на tolerance.
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_site import FakeSliderSite
+
+# Метрика пропускной способности каждого замера (больше - лучше), по ней ищутся регрессии
+THROUGHPUT_KEYS = {
+    'download_images': 'pages_per_min',
+    'stitch_images': 'folders_per_min',
+    'run_scraping_cold': 'pages_per_min',
+    'run_scraping_warm': 'pages_per_min',
+}
+
+
+def _peak_rss_mb():
+    """Пиковый RSS процесса и его дочерних процессов в МБ.
+
+    Воркеры склеивания запускаются через forkserver и в RUSAGE_CHILDREN не
+    попадают: их пиковый RSS приходит из отчета run_scraping (см. _isolated_entry).
+    """
+    unit = 1 if sys.platform == 'darwin' else 1024 # На macOS ru_maxrss в байтах, на Linux в КБ
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit
+    return round(own / 1024 ** 2, 1), round(children / 1024 ** 2, 1)
+
+
+def bench_download(urls, work_dir, bytes_total):
+    import image_scraper
+    from browser_pool import BrowserPool
+    from image_fetcher import ImageFetcher
+
+    with BrowserPool(size=1) as pool, ImageFetcher() as fetcher, contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for url in urls:
+            image_scraper.download_images(url, work_dir, pool=pool, fetcher=fetcher)
+        elapsed = time.perf_counter() - start
+    return {'seconds': round(elapsed, 3), 'pages_per_min': round(len(urls) / elapsed * 60, 1),
+            'mb_per_s': round(bytes_total / elapsed / 1024 ** 2, 2)}
+
+
+def bench_stitch(work_dir, resample_mode):
+    import image_scraper
+
+    folders = sorted(os.path.join(work_dir, d) for d in os.listdir(work_dir)
+                     if os.path.isdir(os.path.join(work_dir, d)) and not d.startswith('.'))
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        for folder in folders:
+            image_scraper.stitch_images(folder, resample_mode=resample_mode)
+        elapsed = time.perf_counter() - start
+    return {'seconds': round(elapsed, 3), 'folders_per_min': round(len(folders) / elapsed * 60, 1),
+            'seconds_per_folder': round(elapsed / max(1, len(folders)), 3)}
+
+
+def bench_run_scraping(urls, work_dir, bytes_total, options):
+    import image_scraper
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        image_scraper.run_scraping(urls, work_dir, **options)
+        elapsed = time.perf_counter() - start
+    with open(os.path.join(work_dir, 'run_report.json'), encoding='utf-8') as f:
+        report = json.load(f)
+    return {'seconds': round(elapsed, 3), 'pages_per_min': round(len(urls) / elapsed * 60, 1),
+            'mb_per_s': round(bytes_total / elapsed / 1024 ** 2, 2),
+            'stages': {stage: {'total_s': s['total_s'], 'p50_s': s['p50_s'], 'p95_s': s['p95_s']}
+                       for stage, s in report['stages'].items()},
+            'counters': report['counters'],
+            'stitch_worker_peak_rss_mb': report.get('maxima', {}).get('stitch_worker_peak_rss_mb')}
+
+
+def _isolated_entry(func, args, conn):
+    try:
+        result = func(*args)
+        result['peak_rss_mb'], children = _peak_rss_mb()
+        # Для run_scraping дочерние - это еще и воркеры склеивания, которые сами сообщают свой пик
+        result['children_peak_rss_mb'] = max(children, result.get('stitch_worker_peak_rss_mb') or 0)
+        conn.send(result)
+    except Exception as e:
+        conn.send({'error': repr(e)})
+    finally:
+        conn.close()
+
+
+def run_isolated(func, *args):
+    """Выполняет замер в отдельном процессе и возвращает его результат."""
+    ctx = multiprocessing.get_context('spawn')
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_isolated_entry, args=(func, args, child_conn))
+    process.start()
+    result = parent_conn.recv()
+    process.join()
+    return result
+
+
+def check_regressions(results, baseline, tolerance):
+    """Сравнивает пропускную способность с базовой; возвращает список регрессий."""
+    regressions = []
+    for name, key in THROUGHPUT_KEYS.items():
+        old = baseline.get('results', {}).get(name, {}).get(key)
+        new = results.get(name, {}).get(key)
+        if old and new is not None and new < old * (1 - tolerance):
+            regressions.append(f"{name}: {key} {old} -> {new} ({(new / old - 1) * 100:+.0f}%)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарки image_scraper на локальном сайте-слайдере")
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--images', type=int, default=8, help="Изображений на странице")
+    parser.add_argument('--width', type=int, default=1600)
+    parser.add_argument('--height', type=int, default=900)
+    parser.add_argument('--format', default='JPEG', choices=['JPEG', 'PNG', 'WEBP', 'GIF'])
+    parser.add_argument('--render', default='static', choices=['static', 'js'],
+                        help="js - теги создаются скриптом (нужен Chrome)")
+    parser.add_argument('--resample-mode', default='balanced')
+    parser.add_argument('--pool-size', type=int, default=2)
+    parser.add_argument('--stitch-processes', type=int, default=None)
+    parser.add_argument('--output', help="Куда сохранить результаты в JSON")
+    parser.add_argument('--baseline', help="JSON прошлого запуска для поиска регрессий")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Допустимое падение пропускной способности")
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix='bench_scraper_')
+    results = {}
+    try:
+        with FakeSliderSite(pages=args.pages, images_per_page=args.images, width=args.width, height=args.height,
+                            image_format=args.format, render=args.render) as site:
+            urls = site.page_urls()
+            bytes_total = site.bytes_per_page * len(urls)
+            print(f"Сайт: {site.base_url}, страниц: {len(urls)}, изображений на странице: {args.images}, "
+                  f"{bytes_total / 1024 ** 2:.1f} МБ всего")
+
+            download_dir = os.path.join(root, 'download')
+            results['download_images'] = run_isolated(bench_download, urls, download_dir, bytes_total)
+            results['stitch_images'] = run_isolated(bench_stitch, download_dir, args.resample_mode)
+
+            options = {'pool_size': args.pool_size, 'stitch_processes': args.stitch_processes,
+                       'resample_mode': args.resample_mode}
+            scrape_dir = os.path.join(root, 'run')
+            results['run_scraping_cold'] = run_isolated(bench_run_scraping, urls, scrape_dir, bytes_total, options)
+            # Повторный запуск того же списка: кеш изображений и манифест
+            results['run_scraping_warm'] = run_isolated(bench_run_scraping, urls, scrape_dir, bytes_total, options)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    for name, result in results.items():
+        if 'error' in result:
+            print(f"  {name:<18} ОШИБКА: {result['error']}")
+            continue
+        key = THROUGHPUT_KEYS[name]
+        print(f"  {name:<18} {result['seconds']:8.2f} с  {key}={result[key]:<8} "
+              f"пиковый RSS={result['peak_rss_mb']} МБ (дочерние {result['children_peak_rss_mb']} МБ)")
+        for stage, stats in result.get('stages', {}).items():
+            print(f"      {stage:<22} сумма={stats['total_s']:.2f} с p50={stats['p50_s']:.3f} с p95={stats['p95_s']:.3f} с")
+
+    data = {'params': vars(args), 'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = check_regressions(results, baseline, args.tolerance)
+        if regressions:
+            print("Найдены регрессии пропускной способности:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print("Регрессий пропускной способности нет.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import queue
+import threading
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+import metrics
+
+# --- Настройки пула браузеров по умолчанию ---
+DEFAULT_POOL_SIZE = 2 # Сколько экземпляров Chrome держать одновременно
+DEFAULT_MAX_PAGES_PER_DRIVER = 50 # После стольких страниц браузер перезапускается (утечки памяти Chrome)
+DEFAULT_PAGE_LOAD_TIMEOUT = 30 # Секунд на driver.get(), чтобы зависшая страница не блокировала браузер
+# ---
+
+
+def create_chrome_driver(headless=True, page_load_timeout=DEFAULT_PAGE_LOAD_TIMEOUT):
+    """Создает новый экземпляр Chrome с настройками для парсинга."""
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument('--headless=new') # Запуск в фоновом режиме (без GUI)
+    options.add_argument('--disable-gpu')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage') # /dev/shm на серверах часто слишком мал
+    # Укажите путь к chromedriver, если он не в PATH
+    # driver = webdriver.Chrome(executable_path='/path/to/chromedriver', options=options)
+    driver = webdriver.Chrome(options=options)
+    driver.set_page_load_timeout(page_load_timeout)
+    return driver
+
+
+class BrowserPool:
+    """Пул долгоживущих браузеров, которые выдаются в аренду на одну страницу.
+
+    Браузеры создаются лениво (не больше size штук), перед выдачей и после
+    возврата проверяются на работоспособность, а после max_pages_per_driver
+    страниц перезапускаются.
+    """
+
+    def __init__(self, size=DEFAULT_POOL_SIZE, max_pages_per_driver=DEFAULT_MAX_PAGES_PER_DRIVER,
+                 headless=True, driver_factory=None):
+        self.size = max(1, int(size))
+        self.max_pages_per_driver = max(1, int(max_pages_per_driver))
+        self._driver_factory = driver_factory or (lambda: create_chrome_driver(headless=headless))
+        self._idle = queue.LifoQueue() # Свободные браузеры: [driver, обслужено_страниц]
+        self._slots = threading.BoundedSemaphore(self.size) # Ограничивает число живых браузеров
+        self._lock = threading.Lock()
+        self._drivers = set() # Все живые браузеры, чтобы закрыть их в close()
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _start_driver(self):
+        with metrics.current().span('browser_start'):
+            driver = self._driver_factory()
+        with self._lock:
+            self._drivers.add(driver)
+        return [driver, 0]
+
+    def _discard(self, entry):
+        driver = entry[0]
+        with self._lock:
+            self._drivers.discard(driver)
+        try:
+            driver.quit()
+        except Exception:
+            pass # Браузер мог уже упасть, закрывать нечего
+
+    @staticmethod
+    def _is_healthy(driver):
+        """Проверяет, что браузер отвечает на команды."""
+        try:
+            return driver.execute_script('return 1') == 1 and bool(driver.window_handles)
+        except WebDriverException:
+            return False
+        except Exception:
+            return False
+
+    def _acquire_entry(self):
+        while True:
+            try:
+                entry = self._idle.get_nowait()
+            except queue.Empty:
+                return self._start_driver()
+            if self._is_healthy(entry[0]):
+                return entry
+            print("Браузер из пула не отвечает, запускаем новый.")
+            self._discard(entry)
+
+    @contextmanager
+    def lease(self):
+        """Выдает браузер на время обработки одной страницы."""
+        if self._closed:
+            raise RuntimeError("Пул браузеров уже закрыт.")
+        self._slots.acquire()
+        entry = None
+        try:
+            entry = self._acquire_entry()
+            yield entry[0]
+        finally:
+            try:
+                if entry is not None:
+                    self._release_entry(entry)
+            finally:
+                self._slots.release()
+
+    def _release_entry(self, entry):
+        entry[1] += 1
+        if self._closed:
+            self._discard(entry)
+        elif entry[1] >= self.max_pages_per_driver:
+            # Перезапускаем браузер, чтобы не копить память долгоживущего Chrome
+            self._discard(entry)
+        elif not self._is_healthy(entry[0]):
+            print("Браузер упал во время обработки страницы, он будет перезапущен.")
+            self._discard(entry)
+        else:
+            self._idle.put(entry)
+
+    def close(self):
+        """Закрывает все браузеры пула."""
+        self._closed = True
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        with self._lock:
+            drivers = list(self._drivers)
+            self._drivers.clear()
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
@@ -0,0 +1,141 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+
+import image_scraper
+from browser_pool import DEFAULT_POOL_SIZE
+from image_dedup import DEFAULT_DEDUP_THRESHOLD
+from image_fetcher import DEFAULT_DOWNLOAD_WORKERS, DEFAULT_PER_HOST_LIMIT
+from pipeline import DEFAULT_QUEUE_SIZE
+from scheduler import JobScheduler, DEFAULT_MAX_ATTEMPTS, DEFAULT_BACKOFF_BASE
+from slider_readiness import DEFAULT_STABILITY_WINDOW
+
+
+def parse_shard(value):
+    """Разбирает '--shard i/N' (i от 1 до N) в пару (i, N)."""
+    try:
+        index, total = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"ожидается формат i/N, получено '{value}'")
+    if total < 1 or not 1 <= index <= total:
+        raise argparse.ArgumentTypeError(f"номер части должен быть от 1 до {total}, получено '{value}'")
+    return index, total
+
+
+def shard_of(url, total):
+    """Номер части (от 1) для URL: стабильный хеш, одинаковый на всех машинах и при любом порядке строк."""
+    digest = hashlib.sha1(url.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % total + 1
+
+
+def read_urls(path):
+    """Читает URL из файла (по одному в строке), как и GUI."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Загрузка и склеивание изображений слайдеров без GUI. "
+                    "Большой список URL можно поделить между машинами через --shard i/N.")
+    parser.add_argument('url_file', help="Файл с URL, по одному в строке")
+    parser.add_argument('-o', '--output-dir', required=True, help="Папка для сохранения изображений")
+    parser.add_argument('--shard', type=parse_shard, default=(1, 1), metavar='i/N',
+                        help="Обработать только i-ю из N частей списка (по хешу URL)")
+    parser.add_argument('--pool-size', type=int, default=DEFAULT_POOL_SIZE, help="Браузеров в пуле")
+    parser.add_argument('--download-workers', type=int, default=DEFAULT_DOWNLOAD_WORKERS,
+                        help="Потоков загрузки изображений")
+    parser.add_argument('--per-host-limit', type=int, default=DEFAULT_PER_HOST_LIMIT,
+                        help="Одновременных запросов к одному хосту")
+    parser.add_argument('--stitch-processes', type=int, default=None,
+                        help="Процессов склеивания (по умолчанию по числу ядер)")
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Размер очередей между этапами")
+    parser.add_argument('--stability-window', type=float, default=DEFAULT_STABILITY_WINDOW,
+                        help="Секунд стабильности набора изображений слайдера")
+    parser.add_argument('--resample-mode', choices=sorted(image_scraper.RESAMPLE_MODES),
+                        default=image_scraper.DEFAULT_RESAMPLE_MODE)
+    parser.add_argument('--max-output-width', type=int, default=None, help="Максимальная ширина склейки")
+    parser.add_argument('--target-width', type=int, default=None,
+                        help="Качать из srcset самый маленький вариант не уже этой ширины "
+                             "(по умолчанию --max-output-width, без них - обычный src)")
+    parser.add_argument('--dedup', action='store_true',
+                        help="Не вставлять в склейку повторяющиеся кадры (клоны слайдера)")
+    parser.add_argument('--dedup-threshold', type=int, default=DEFAULT_DEDUP_THRESHOLD,
+                        help="Порог повторов для --dedup в битах dHash (0 - только почти точные совпадения)")
+    parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help="Попыток на страницу при временных ошибках")
+    parser.add_argument('--backoff', type=float, default=DEFAULT_BACKOFF_BASE,
+                        help="Секунд до первого повтора (дальше задержка удваивается)")
+    parser.add_argument('--job-timeout', type=float, default=None, help="Секунд на одну страницу со всеми повторами")
+    parser.add_argument('--no-cache', action='store_true', help="Не использовать кеш изображений")
+    parser.add_argument('--no-manifest', action='store_true', help="Не вести манифест (без продолжения запусков)")
+    parser.add_argument('--profile-dir', default=None, help="Сохранять профили cProfile по страницам")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Подробный лог (замеры каждого этапа)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+    shard_index, shard_total = args.shard
+    try:
+        all_urls = read_urls(args.url_file)
+    except OSError as e:
+        print(f"Не удалось прочитать файл с URL: {e}", file=sys.stderr)
+        return 2
+    urls = [url for url in all_urls if shard_of(url, shard_total) == shard_index]
+    print(f"Часть {shard_index}/{shard_total}: {len(urls)} из {len(all_urls)} URL")
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    shard_name = f"shard_{shard_index}_of_{shard_total}"
+    report_path = os.path.join(args.output_dir, f"run_report_{shard_name}.json")
+    started = time.time()
+    stitched = []
+    scheduler = JobScheduler(max_attempts=args.max_attempts, backoff_base=args.backoff, job_timeout=args.job_timeout)
+    if urls:
+        stitched = image_scraper.run_scraping(
+            urls, args.output_dir,
+            pool_size=args.pool_size,
+            download_workers=args.download_workers,
+            per_host_limit=args.per_host_limit,
+            queue_size=args.queue_size,
+            stability_window=args.stability_window,
+            use_cache=not args.no_cache,
+            resample_mode=args.resample_mode,
+            max_output_width=args.max_output_width,
+            dedup_threshold=args.dedup_threshold if args.dedup else None,
+            target_width=args.target_width,
+            stitch_processes=args.stitch_processes,
+            use_manifest=not args.no_manifest,
+            report_path=report_path,
+            profile_dir=args.profile_dir,
+            scheduler=scheduler,
+        ) or []
+
+    result = {
+        'shard': shard_index,
+        'shards': shard_total,
+        'url_file': os.path.abspath(args.url_file),
+        'urls': urls,
+        'stitched': stitched,
+        'jobs': scheduler.summary(),
+        'report': report_path if urls else None,
+        'started_at': started,
+        'elapsed_s': round(time.time() - started, 3),
+    }
+    result_path = os.path.join(args.output_dir, f"{shard_name}.json")
+    with open(result_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"Результаты части сохранены: {result_path}")
+    return 0 if stitched or not urls else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,34 @@
+import threading
+from urllib.parse import urlsplit
+
+# Способы получения разметки страницы
+MODE_STATIC = 'static' # Обычный HTTP-запрос + BeautifulSoup
+MODE_BROWSER = 'browser' # Полная отрисовка в Chrome через Selenium
+
+
+class FetchModeMemory:
+    """Запоминает для каждого домена, какой способ получения страницы сработал.
+
+    Если на домене слайдер отдается прямо в HTML, следующие страницы
+    этого домена сразу идут по быстрому пути без браузера, и наоборот.
+    """
+
+    def __init__(self):
+        self._modes = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _host(url):
+        return urlsplit(url).netloc.lower()
+
+    def get(self, url):
+        """Возвращает запомненный режим для домена url или None."""
+        with self._lock:
+            return self._modes.get(self._host(url))
+
+    def remember(self, url, mode):
+        with self._lock:
+            previous = self._modes.get(self._host(url))
+            self._modes[self._host(url)] = mode
+        if previous != mode:
+            print(f"Для домена {self._host(url)} используется режим: {mode}")
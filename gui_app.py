@@ -5,6 +5,13 @@ import os
 import sys
 import io
 import logging
+import queue
+
+# --- Настройки вывода логов в GUI ---
+LOG_POLL_INTERVAL_MS = 100 # Как часто накопленные сообщения переносятся в виджет
+MAX_LOG_LINES = 5000 # Сколько последних строк хранить в окне логов
+MAX_ITEMS_PER_POLL = 10000 # Ограничение за один проход, чтобы не подвесить интерфейс
+# ---
 
 # Попытка импортировать функции из image_scraper
 try:
@@ -16,26 +23,55 @@ try:
     
     # Предполагаем, что image_scraper.py находится в той же директории
     import image_scraper 
+    from scheduler import JobScheduler
 except ImportError as e:
     messagebox.showerror("Ошибка импорта", f"Не удалось импортировать image_scraper.py: {e}\nУбедитесь, что файл находится в той же директории.")
     sys.exit(1)
 
+class LogChannel:
+    """Потокобезопасная очередь сообщений и событий прогресса для GUI.
+
+    Рабочие потоки только кладут данные в очередь, а главный поток Tkinter
+    забирает их пачкой по таймеру (см. ImageScraperApp.poll_log_channel),
+    вместо отдельного вызова after() на каждый print.
+    """
+    def __init__(self):
+        self._queue = queue.Queue()
+
+    def write(self, text):
+        if text:
+            self._queue.put(('text', text))
+
+    def progress(self, event):
+        self._queue.put(('progress', event))
+
+    def drain(self, max_items=MAX_ITEMS_PER_POLL):
+        """Забирает все накопленное (не больше max_items): (текст одной строкой, последнее событие прогресса)."""
+        texts = []
+        last_progress = None
+        for _ in range(max_items):
+            try:
+                kind, payload = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'text':
+                texts.append(payload)
+            else:
+                last_progress = payload
+        return ''.join(texts), last_progress
+
 # Класс GuiHandler теперь использует импортированный logging
 class GuiHandler(logging.Handler):
-    """Обработчик логов для вывода в Tkinter Text виджет."""
-    def __init__(self, text_widget):
+    """Обработчик логов, передающий записи в LogChannel для вывода в GUI."""
+    def __init__(self, channel):
         logging.Handler.__init__(self)
-        self.text_widget = text_widget
+        self.channel = channel
 
     def emit(self, record):
-        msg = self.format(record)
-        def append():
-            self.text_widget.configure(state='normal')
-            self.text_widget.insert(tk.END, msg + '\n')
-            self.text_widget.configure(state='disabled')
-            self.text_widget.yview(tk.END) # Автопрокрутка
-        # Выполняем обновление виджета в главном потоке Tkinter
-        self.text_widget.after(0, append)
+        try:
+            self.channel.write(self.format(record) + '\n')
+        except Exception:
+            self.handleError(record)
 
 class ImageScraperApp:
     def __init__(self, root):
@@ -46,6 +82,7 @@ class ImageScraperApp:
         self.url_file_path = tk.StringVar()
         self.save_dir_path = tk.StringVar()
         self.urls = []
+        self.scheduler = None # Планировщик текущего запуска (пауза и остановка)
 
         # --- Фреймы для организации --- 
         top_frame = tk.Frame(root, padx=10, pady=5)
@@ -73,23 +110,31 @@ class ImageScraperApp:
         self.log_area.pack(fill=tk.BOTH, expand=True, pady=5)
 
         # --- Прогресс --- 
-        self.progress_bar = ttk.Progressbar(bottom_frame, orient='horizontal', mode='indeterminate') # Изменено на indeterminate
+        self.progress_bar = ttk.Progressbar(bottom_frame, orient='horizontal', mode='determinate')
         self.progress_bar.pack(fill=tk.X, pady=5)
+        self.progress_text = tk.StringVar(value="")
+        tk.Label(bottom_frame, textvariable=self.progress_text, anchor=tk.W).pack(fill=tk.X)
 
         # --- Кнопки управления --- 
         button_frame = tk.Frame(bottom_frame)
         button_frame.pack(pady=5)
         self.start_button = tk.Button(button_frame, text="Начать", command=self.start_scraping_thread)
         self.start_button.pack(side=tk.LEFT, padx=10)
+        self.pause_button = tk.Button(button_frame, text="Пауза", command=self.toggle_pause, state=tk.DISABLED)
+        self.pause_button.pack(side=tk.LEFT, padx=10)
+        self.stop_button = tk.Button(button_frame, text="Остановить", command=self.stop_scraping, state=tk.DISABLED)
+        self.stop_button.pack(side=tk.LEFT, padx=10)
         self.copy_log_button = tk.Button(button_frame, text="Копировать логи", command=self.copy_logs)
         self.copy_log_button.pack(side=tk.LEFT, padx=10)
 
         # Настройка логирования для вывода в GUI
+        self.log_channel = LogChannel()
         self.setup_logging()
+        self.poll_log_channel()
 
     def setup_logging(self):
         """Настраивает стандартный модуль logging для вывода в GUI."""
-        log_text_handler = GuiHandler(self.log_area)
+        log_text_handler = GuiHandler(self.log_channel)
         log_format = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
         log_text_handler.setFormatter(log_format)
         
@@ -100,8 +145,24 @@ class ImageScraperApp:
         logger.addHandler(log_text_handler)
 
         # Перехватываем stdout и stderr
-        sys.stdout = LoggerRedirector(self.log_area, "stdout")
-        sys.stderr = LoggerRedirector(self.log_area, "stderr")
+        sys.stdout = LoggerRedirector(self.log_channel, "stdout")
+        sys.stderr = LoggerRedirector(self.log_channel, "stderr")
+
+    def poll_log_channel(self):
+        """Переносит накопленные логи в виджет одной вставкой и обновляет прогресс."""
+        text, progress_event = self.log_channel.drain()
+        if text:
+            self.log_area.configure(state='normal')
+            self.log_area.insert(tk.END, text)
+            # Обрезаем старые строки, чтобы виджет не рос бесконечно
+            line_count = int(self.log_area.index('end-1c').split('.')[0])
+            if line_count > MAX_LOG_LINES:
+                self.log_area.delete('1.0', f'{line_count - MAX_LOG_LINES + 1}.0')
+            self.log_area.configure(state='disabled')
+            self.log_area.yview(tk.END) # Автопрокрутка
+        if progress_event:
+            self.update_progress(progress_event)
+        self.root.after(LOG_POLL_INTERVAL_MS, self.poll_log_channel)
 
     def select_url_file(self):
         filepath = filedialog.askopenfilename(title="Выберите файл с URL", filetypes=(("Text/CSV files", "*.txt *.csv"), ("All files", "*.*")))
@@ -138,9 +199,12 @@ class ImageScraperApp:
             return
 
         self.start_button.config(state=tk.DISABLED)
-        # self.progress_bar['value'] = 0 # Не нужно для indeterminate
-        # self.progress_bar['maximum'] = len(self.urls) # Не нужно для indeterminate
-        self.progress_bar.start(10) # Запускаем анимацию indeterminate
+        self.scheduler = JobScheduler()
+        self.pause_button.config(state=tk.NORMAL, text="Пауза")
+        self.stop_button.config(state=tk.NORMAL)
+        self.progress_bar['value'] = 0
+        self.progress_bar['maximum'] = len(self.urls)
+        self.progress_text.set(f"Страниц: 0/{len(self.urls)}")
         print("--- Начало процесса --- ")
 
         # Запускаем парсинг в отдельном потоке
@@ -151,15 +215,23 @@ class ImageScraperApp:
         save_dir = self.save_dir_path.get()
         urls_to_process = self.urls[:] # Копируем список URL
 
+        completed = False # Прогресс-бар заполняется до конца, только если запуск дошел до конца
         try:
             # Вызываем единую функцию из image_scraper, передавая список URL и папку
             print("Передача управления в image_scraper.run_scraping...")
-            image_scraper.run_scraping(urls_to_process, save_dir)
+            # События прогресса приходят из рабочих потоков и идут через ту же очередь, что и логи
+            image_scraper.run_scraping(urls_to_process, save_dir, progress_callback=self.log_channel.progress,
+                                       scheduler=self.scheduler)
 
             # Сообщение об успешном завершении (выполняется после run_scraping)
             # Используем after для вызова в главном потоке Tkinter
             print("Процесс в image_scraper завершен. Показ сообщения...")
-            self.root.after(0, lambda: messagebox.showinfo("Завершено", "Загрузка и склеивание изображений завершены."))
+            if self.scheduler.cancelled:
+                self.root.after(0, lambda: messagebox.showinfo("Остановлено", "Обработка остановлена. "
+                                                               "Следующий запуск продолжит с места остановки."))
+            else:
+                completed = True
+                self.root.after(0, lambda: messagebox.showinfo("Завершено", "Загрузка и склеивание изображений завершены."))
 
         except Exception as e:
             # Логируем ошибку и показываем сообщение
@@ -169,33 +241,62 @@ class ImageScraperApp:
         finally:
             # Останавливаем прогресс-бар и активируем кнопку в главном потоке
             print("Остановка прогресс-бара и активация кнопки...")
-            self.root.after(0, self.stop_progress_and_enable_button)
-
-    # def update_progress(self, value): # Больше не используется с indeterminate
-    #     pass # self.progress_bar['value'] = value
+            self.root.after(0, lambda: self.stop_progress_and_enable_button(completed))
 
-    def stop_progress_and_enable_button(self):
-        """Останавливает прогресс-бар и активирует кнопку 'Начать'."""
-        self.progress_bar.stop()
-        # self.progress_bar['value'] = 0 # Сброс значения, если нужно
+    def toggle_pause(self):
+        """Ставит запуск на паузу или продолжает его (начатые страницы дорабатываются)."""
+        if self.scheduler is None:
+            return
+        if self.scheduler.paused:
+            self.scheduler.resume()
+            self.pause_button.config(text="Пауза")
+            print("--- Продолжение --- ")
+        else:
+            self.scheduler.pause()
+            self.pause_button.config(text="Продолжить")
+            print("--- Пауза: новые страницы не начинаются --- ")
+
+    def stop_scraping(self):
+        """Отменяет запуск: очередь очищается, начатые страницы завершаются."""
+        if self.scheduler is None:
+            return
+        self.scheduler.cancel()
+        self.pause_button.config(state=tk.DISABLED)
+        self.stop_button.config(state=tk.DISABLED)
+        print("--- Остановка: дожидаемся страниц, которые уже в работе --- ")
+
+    def update_progress(self, event):
+        """Обновляет прогресс-бар по событию из run_scraping (вызывается в главном потоке)."""
+        counts = event['counts']
+        self.progress_bar['maximum'] = max(1, event['total'])
+        self.progress_bar['value'] = event['done']
+        self.progress_text.set(f"Страниц: {event['done']}/{event['total']} "
+                               f"(загружено: {counts['downloaded']}, склеено: {counts['stitched']}, "
+                               f"без изображений: {counts['skipped']}, ошибок: {counts['failed']})")
+
+    def stop_progress_and_enable_button(self, completed=True):
+        """Останавливает прогресс-бар и активирует кнопку 'Начать'.
+
+        После остановки или ошибки бар остается на последнем значении done.
+        """
+        if completed:
+            self.progress_bar['value'] = self.progress_bar['maximum']
         self.start_button.config(state=tk.NORMAL)
+        self.pause_button.config(state=tk.DISABLED, text="Пауза")
+        self.stop_button.config(state=tk.DISABLED)
 
-# Класс для перенаправления stdout/stderr в текстовый виджет
+# Класс для перенаправления stdout/stderr в окно логов через LogChannel
 class LoggerRedirector(io.TextIOBase):
-    def __init__(self, widget, stream_type):
-        self.widget = widget
+    def __init__(self, channel, stream_type):
+        self.channel = channel
         self.stream_type = stream_type # 'stdout' или 'stderr'
 
     def write(self, msg):
-        def append():
-            self.widget.configure(state='normal')
-            # Можно добавить префикс, чтобы различать stdout и stderr
-            # prefix = f"[{self.stream_type.upper()}] " if self.stream_type == 'stderr' else ""
-            # self.widget.insert(tk.END, prefix + msg)
-            self.widget.insert(tk.END, msg)
-            self.widget.configure(state='disabled')
-            self.widget.yview(tk.END)
-        self.widget.after(0, append)
+        # Можно добавить префикс, чтобы различать stdout и stderr
+        # prefix = f"[{self.stream_type.upper()}] " if self.stream_type == 'stderr' else ""
+        # Виджет не трогаем: из любого потока только кладем текст в очередь
+        self.channel.write(msg)
+        return len(msg)
 
     def flush(self):
         # Tkinter Text виджет не требует flush в этом контексте
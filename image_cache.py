@@ -0,0 +1,141 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+# --- Настройки кеша изображений по умолчанию ---
+DEFAULT_CACHE_DIRNAME = '.image_cache' # Подпапка кеша внутри папки сохранения
+DEFAULT_CACHE_MAX_BYTES = 2 * 1024 ** 3 # Размер хранилища, после которого вытесняются давно не использованные файлы
+# ---
+
+_INDEX_FILENAME = 'index.json'
+
+
+class ImageCache:
+    """Постоянный кеш изображений с адресацией по содержимому.
+
+    Для каждого URL хранятся ETag/Last-Modified и SHA-256 содержимого,
+    сами файлы лежат один раз в objects/<sha256[:2]>/<sha256>. В папки страниц
+    они попадают жесткими ссылками, поэтому одинаковые изображения разных
+    страниц не дублируются на диске. Когда хранилище превышает max_bytes,
+    удаляются объекты, которые дольше всего не использовались (LRU).
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._objects_dir = os.path.join(cache_dir, 'objects')
+        self._index_path = os.path.join(cache_dir, _INDEX_FILENAME)
+        self._lock = threading.Lock()
+        os.makedirs(self._objects_dir, exist_ok=True)
+        self._urls, self._objects = self._load_index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _load_index(self):
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data.get('urls', {}), data.get('objects', {})
+        except FileNotFoundError:
+            return {}, {}
+        except Exception as e:
+            print(f"Индекс кеша изображений поврежден, кеш будет заполнен заново: {e}")
+            return {}, {}
+
+    def _object_path(self, sha256):
+        return os.path.join(self._objects_dir, sha256[:2], sha256)
+
+    def lookup(self, url):
+        """Возвращает запись кеша для url, если ее файл еще на месте."""
+        with self._lock:
+            entry = self._urls.get(url)
+            if entry and os.path.exists(self._object_path(entry['sha256'])):
+                return dict(entry)
+            return None
+
+    @staticmethod
+    def conditional_headers(entry):
+        """Заголовки условного запроса для ранее скачанного изображения."""
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store_file(self, url, src_path, sha256, size, ext, etag=None, last_modified=None):
+        """Переносит скачанный файл src_path в хранилище (если такого содержимого еще нет) и возвращает запись кеша."""
+        object_path = self._object_path(sha256)
+        if os.path.exists(object_path):
+            os.remove(src_path) # Такое содержимое уже есть (то же изображение с другой страницы)
+        else:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            try:
+                os.replace(src_path, object_path)
+            except OSError:
+                # Временный файл на другой файловой системе
+                shutil.move(src_path, object_path)
+        return self.store_object(url, sha256, size, ext, etag=etag, last_modified=last_modified)
+
+    def store_object(self, url, sha256, size, ext, etag=None, last_modified=None):
+        """Регистрирует уже лежащий в хранилище объект для url."""
+        entry = {'sha256': sha256, 'ext': ext, 'etag': etag, 'last_modified': last_modified}
+        with self._lock:
+            self._urls[url] = entry
+            self._objects[sha256] = {'size': size, 'last_used': time.time()}
+        return dict(entry)
+
+    def link_into(self, entry, dest_path):
+        """Помещает объект из кеша по пути dest_path жесткой ссылкой (или копией)."""
+        object_path = self._object_path(entry['sha256'])
+        with self._lock:
+            if entry['sha256'] in self._objects:
+                self._objects[entry['sha256']]['last_used'] = time.time()
+        if os.path.exists(dest_path) and os.path.samefile(object_path, dest_path):
+            return # Файл страницы уже ссылается на этот объект
+        tmp_path = f"{dest_path}.{threading.get_ident()}.tmp"
+        try:
+            os.link(object_path, tmp_path)
+        except OSError:
+            # Другая файловая система или жесткие ссылки не поддерживаются
+            shutil.copyfile(object_path, tmp_path)
+        os.replace(tmp_path, dest_path)
+
+    def _evict(self):
+        total = sum(obj['size'] for obj in self._objects.values())
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for sha256, obj in sorted(self._objects.items(), key=lambda item: item[1]['last_used']):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._object_path(sha256))
+            except FileNotFoundError:
+                pass
+            total -= obj['size']
+            del self._objects[sha256]
+            evicted += 1
+        live = set(self._objects)
+        self._urls = {url: entry for url, entry in self._urls.items() if entry['sha256'] in live}
+        print(f"Кеш изображений: вытеснено файлов: {evicted}")
+
+    def save(self):
+        """Вытесняет лишнее и атомарно записывает индекс на диск."""
+        with self._lock:
+            self._evict()
+            data = {'urls': self._urls, 'objects': self._objects}
+            tmp_path = f"{self._index_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self._index_path)
+
+    def close(self):
+        self.save()
@@ -0,0 +1,173 @@
+import json
+import os
+
+from PIL import Image
+
+import metrics
+
+# --- Настройки поиска дубликатов по умолчанию ---
+DEFAULT_DEDUP_THRESHOLD = 4 # Предлагаемый порог (бит из 64), если поиск повторов включен; по умолчанию он выключен
+DEFAULT_HASH_CACHE_FILENAME = '.phash_cache.json' # Кеш хешей внутри папки страницы
+HASH_SIZE = 8 # dHash 8x8 = 64 бита
+MAX_ASPECT_DIFFERENCE = 0.05 # Кадры с заметно разными пропорциями дубликатами не считаются
+CONFIRM_SIZE = 32 # Сторона миниатюры для попиксельной проверки кандидатов в повторы
+CONFIRM_PIXEL_TOLERANCE = 32 # Максимальная разница яркости пикселя миниатюр у настоящих повторов
+# ---
+
+
+def dhash(path, hash_size=HASH_SIZE):
+    """Разностный перцептивный хеш (dHash) изображения в виде целого числа.
+
+    Изображение уменьшается до (hash_size + 1) x hash_size в оттенках серого,
+    и каждый бит показывает, ярче ли пиксель своего правого соседа. JPEG
+    декодируется через draft сразу в уменьшенном виде, поэтому полное
+    декодирование больших кадров не нужно.
+    """
+    pixels = _grayscale_thumbnail(path, (hash_size + 1, hash_size))
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def _grayscale_thumbnail(path, size):
+    """Байты уменьшенной до size копии изображения в оттенках серого (JPEG - через draft)."""
+    with Image.open(path) as img:
+        if img.format == 'JPEG':
+            img.draft('L', (size[0] * 8, size[1] * 8))
+        return img.convert('L').resize(size, Image.Resampling.BOX).tobytes()
+
+
+def same_pixels(path_a, path_b, size=CONFIRM_SIZE, tolerance=CONFIRM_PIXEL_TOLERANCE):
+    """Подтверждает повтор: миниатюры size x size отличаются в каждом пикселе не больше чем на tolerance.
+
+    dHash у разных кадров с похожей композицией (например, текст на белом
+    фоне) может совпадать почти полностью, а эта проверка ловит любое
+    локальное различие, оставаясь нечувствительной к пересжатию и масштабу.
+    """
+    a = _grayscale_thumbnail(path_a, (size, size))
+    b = _grayscale_thumbnail(path_b, (size, size))
+    return all(abs(x - y) <= tolerance for x, y in zip(a, b))
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class HashCache:
+    """Кеш перцептивных хешей папки в файле .phash_cache.json.
+
+    Хеш файла считается действительным, пока не изменились его размер и
+    время изменения, поэтому повторные запуски не декодируют изображения заново.
+    """
+
+    def __init__(self, folder_path, filename=DEFAULT_HASH_CACHE_FILENAME):
+        self.path = os.path.join(folder_path, filename)
+        self._entries = {}
+        self._dirty = False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {} # Нет кеша или он поврежден: хеши будут посчитаны заново
+
+    def get(self, info):
+        entry = self._entries.get(info['filename'])
+        if entry and entry.get('size') == info['size'] and entry.get('mtime') == info['mtime']:
+            return int(entry['hash'], 16)
+        return None
+
+    def put(self, info, value):
+        self._entries[info['filename']] = {'size': info['size'], 'mtime': info['mtime'], 'hash': f"{value:016x}"}
+        self._dirty = True
+
+    def save(self, keep_filenames=None):
+        """Сохраняет кеш, забыв файлы, которых больше нет в папке."""
+        if keep_filenames is not None:
+            for filename in set(self._entries) - set(keep_filenames):
+                del self._entries[filename]
+                self._dirty = True
+        if not self._dirty:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, sort_keys=True)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except OSError as e:
+            print(f"Не удалось сохранить кеш хешей {self.path}: {e}")
+
+
+def image_hashes(images_data, cache=None):
+    """Возвращает dHash для каждого элемента индекса scan_image_metadata (None, если не удалось)."""
+    run_metrics = metrics.current()
+    hashes = []
+    for info in images_data:
+        value = cache.get(info) if cache is not None else None
+        if value is None:
+            try:
+                with run_metrics.span('phash'):
+                    value = dhash(info['path'])
+            except Exception as e:
+                print(f"Не удалось вычислить хеш изображения {info['filename']}: {e}")
+                hashes.append(None)
+                continue
+            run_metrics.incr('phash_computed')
+            if cache is not None:
+                cache.put(info, value)
+        else:
+            run_metrics.incr('phash_cached')
+        hashes.append(value)
+    return hashes
+
+
+def drop_duplicates(images_data, threshold=DEFAULT_DEDUP_THRESHOLD, use_cache=True):
+    """Убирает из индекса папки точные и почти точные повторы кадров.
+
+    Слайдеры с бесконечной прокруткой часто содержат клоны кадров. Кадр
+    отбрасывается, если он отличается от одного из уже оставленных не больше
+    чем на threshold бит dHash, у них близкие пропорции и повтор подтвержден
+    попиксельным сравнением миниатюр (same_pixels); из повторов остается
+    первый по порядку склейки. Файлы с диска не удаляются.
+    Возвращает (оставленные, [(отброшенный, оригинал, расстояние), ...]).
+    """
+    if not images_data:
+        return images_data, []
+    folder_path = os.path.dirname(images_data[0]['path'])
+    cache = HashCache(folder_path) if use_cache else None
+    hashes = image_hashes(images_data, cache)
+    if cache is not None:
+        cache.save(keep_filenames=[info['filename'] for info in images_data])
+
+    run_metrics = metrics.current()
+    kept, kept_hashes, dropped = [], [], []
+    for info, value in zip(images_data, hashes):
+        duplicate_of = None
+        if value is not None:
+            aspect = info['width'] / info['height']
+            for other, other_value in zip(kept, kept_hashes):
+                if other_value is None:
+                    continue
+                distance = hamming_distance(value, other_value)
+                other_aspect = other['width'] / other['height']
+                if distance > threshold or abs(aspect - other_aspect) > MAX_ASPECT_DIFFERENCE * other_aspect:
+                    continue
+                try:
+                    with run_metrics.span('phash_confirm'):
+                        confirmed = same_pixels(info['path'], other['path'])
+                except Exception as e:
+                    print(f"Не удалось сравнить {info['filename']} и {other['filename']}: {e}")
+                    confirmed = False
+                if confirmed:
+                    duplicate_of = (other, distance)
+                    break
+        if duplicate_of:
+            dropped.append((info, duplicate_of[0], duplicate_of[1]))
+        else:
+            kept.append(info)
+            kept_hashes.append(value)
+    run_metrics.incr('images_deduplicated', len(dropped))
+    return kept, dropped
@@ -0,0 +1,153 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- Настройки загрузки изображений по умолчанию ---
+DEFAULT_DOWNLOAD_WORKERS = 8 # Потоков загрузки изображений
+DEFAULT_PER_HOST_LIMIT = 4 # Одновременных запросов к одному хосту
+DEFAULT_TIMEOUT = (5, 30) # (подключение, чтение) в секундах для requests
+DEFAULT_MAX_IN_FLIGHT = 32 # Максимум поставленных в очередь и выполняющихся загрузок
+DEFAULT_CHUNK_SIZE = 64 * 1024 # Байт, читаемых из ответа за раз при потоковой загрузке
+# ---
+
+# Сигнатуры начала файла -> формат (имена как у PIL.Image.format, в нижнем регистре)
+_MAGIC_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'BM', 'bmp'),
+)
+_CONTENT_TYPE_FORMATS = {'jpg': 'jpeg', 'pjpeg': 'jpeg', 'x-ms-bmp': 'bmp'}
+
+
+def sniff_image_format(head, content_type=None):
+    """Определяет формат изображения по первым байтам или по Content-Type без декодирования.
+
+    Возвращает расширение ('jpeg', 'png', ...) или None, если это не изображение.
+    """
+    for signature, image_format in _MAGIC_SIGNATURES:
+        if head.startswith(signature):
+            return image_format
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    if content_type:
+        mime = content_type.split(';')[0].strip().lower()
+        if mime.startswith('image/'):
+            subtype = mime[len('image/'):].split('+')[0]
+            return _CONTENT_TYPE_FORMATS.get(subtype, subtype) or None
+    return None
+
+
+class ImageFetcher:
+    """Параллельная загрузка изображений через общий пул HTTP-соединений.
+
+    Все запросы идут через одну requests.Session, поэтому соединения
+    с хостом (keep-alive) переиспользуются. Число одновременных запросов
+    ограничено на каждый хост (per_host_limit) и в целом (max_in_flight):
+    submit() блокируется, пока очередь заполнена.
+    """
+
+    def __init__(self, max_workers=DEFAULT_DOWNLOAD_WORKERS, per_host_limit=DEFAULT_PER_HOST_LIMIT,
+                 timeout=DEFAULT_TIMEOUT, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        self.max_workers = max(1, int(max_workers))
+        self.per_host_limit = max(1, int(per_host_limit))
+        self.timeout = timeout
+        self.session = requests.Session()
+        # pool_maxsize соответствует лимиту на хост, чтобы лишние соединения не открывались и не закрывались
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=self.per_host_limit)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='image-fetch')
+        self._in_flight = threading.BoundedSemaphore(max(self.max_workers, int(max_in_flight)))
+        self._host_limits = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _host_semaphore(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            semaphore = self._host_limits.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.per_host_limit)
+                self._host_limits[host] = semaphore
+            return semaphore
+
+    def get(self, url, **kwargs):
+        """Выполняет GET с учетом лимита на хост; бросает исключение при HTTP-ошибке."""
+        kwargs.setdefault('timeout', self.timeout)
+        with self._host_semaphore(url):
+            response = self.session.get(url, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def download_to_file(self, url, path, headers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Потоково скачивает тело ответа в файл path, не держа его целиком в памяти.
+
+        Возвращает словарь с полями status, etag, last_modified, content_type,
+        sha256, size и head (первые байты для определения формата).
+        При ответе 304 файл не создается. При ошибке недокачанный файл удаляется.
+        """
+        with self._host_semaphore(url):
+            with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+                response.raise_for_status()
+                result = {
+                    'status': response.status_code,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'content_type': response.headers.get('Content-Type'),
+                    'sha256': None,
+                    'size': 0,
+                    'head': b'',
+                }
+                if response.status_code == 304:
+                    return result
+
+                digest = hashlib.sha256()
+                try:
+                    with open(path, 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            if not chunk:
+                                continue
+                            if len(result['head']) < 16:
+                                result['head'] += chunk[:16]
+                            digest.update(chunk)
+                            f.write(chunk)
+                            result['size'] += len(chunk)
+                except BaseException:
+                    if os.path.exists(path):
+                        os.remove(path)
+                    raise
+                result['sha256'] = digest.hexdigest()
+                return result
+
+    def submit(self, func, *args, **kwargs):
+        """Ставит задачу загрузки в пул потоков (блокируется, если очередь заполнена)."""
+        self._in_flight.acquire()
+        try:
+            future = self._executor.submit(func, *args, **kwargs)
+        except Exception:
+            self._in_flight.release()
+            raise
+        future.add_done_callback(lambda _: self._in_flight.release())
+        return future
+
+    def map_wait(self, func, items):
+        """Запускает func(item) для всех элементов и дожидается завершения; возвращает результаты по порядку."""
+        futures = [self.submit(func, item) for item in items]
+        wait(futures)
+        return [future.result() for future in futures]
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
@@ -2,153 +2,367 @@ import os
 import requests
 from bs4 import BeautifulSoup
 from PIL import Image
-from io import BytesIO
+import cProfile
+import hashlib
+import io
+import json
+import multiprocessing
 import re
-import time
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
-from urllib.parse import urljoin
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext, redirect_stdout
+
+from selenium.common.exceptions import WebDriverException
+
+from browser_pool import BrowserPool, DEFAULT_POOL_SIZE, DEFAULT_MAX_PAGES_PER_DRIVER
+from image_fetcher import ImageFetcher, sniff_image_format, DEFAULT_DOWNLOAD_WORKERS, DEFAULT_PER_HOST_LIMIT, DEFAULT_TIMEOUT
+from pipeline import Stage, run_pipeline, DEFAULT_QUEUE_SIZE
+from image_cache import ImageCache, DEFAULT_CACHE_DIRNAME, DEFAULT_CACHE_MAX_BYTES
+import metrics
+from metrics import DEFAULT_REPORT_FILENAME
+from manifest import RunManifest, DEFAULT_MANIFEST_FILENAME
+from fetch_modes import FetchModeMemory, MODE_STATIC, MODE_BROWSER
+from image_sources import select_image_url
+from image_dedup import drop_duplicates
+from scheduler import JobScheduler, JobCancelled, TransientError, FAILED, EXPIRED
+from slider_readiness import wait_for_images_ready, DEFAULT_READY_TIMEOUT, DEFAULT_STABILITY_WINDOW
 
 # --- Настройка Selenium --- 
 # Убедитесь, что у вас установлен WebDriver (например, chromedriver)
-# и он доступен в PATH, или укажите путь к нему:
-# options = webdriver.ChromeOptions()
-# options.add_argument('--headless') # Запуск в фоновом режиме (без GUI)
-# driver = webdriver.Chrome(options=options) 
-# Или:
-# driver = webdriver.Firefox() 
+# и он доступен в PATH. Браузеры создаются в browser_pool.create_chrome_driver
+# и переиспользуются между URL через BrowserPool.
 # ---
 
-def download_images(url, save_dir):
-    """Загружает изображения со слайдера на странице и сохраняет их."""
+# --- Настройки склеивания ---
+DEFAULT_MAX_PART_PIXELS = 40_000_000 # Пикселей в одной части склейки (~120 МБ RGB в памяти)
+JPEG_MAX_DIMENSION = 65500 # Максимальная высота/ширина, которую поддерживает JPEG
+IMAGE_EXTENSIONS = ('png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp')
+# Режим масштабирования -> (draft-декодирование JPEG, фильтр, reducing_gap для Image.resize)
+RESAMPLE_MODES = {
+    'quality': (False, Image.Resampling.LANCZOS, None), # Как раньше: полное декодирование + LANCZOS
+    'balanced': (True, Image.Resampling.LANCZOS, 3.0),
+    'fast': (True, Image.Resampling.BILINEAR, 2.0),
+}
+DEFAULT_RESAMPLE_MODE = 'balanced'
+# ---
+
+# Используем селектор, подтвержденный через Puppeteer
+SLIDER_SELECTOR = 'div#masterslider_div img' # Более точный селектор для слайдера
+
+# Общая память режимов по доменам для вызовов download_images без явного modes
+_default_fetch_modes = FetchModeMemory()
+# cProfile не допускает нескольких активных профилировщиков (Python 3.12+)
+_profile_lock = threading.Lock()
+
+def download_images(url, save_dir, pool=None, fetcher=None, stability_window=DEFAULT_STABILITY_WINDOW,
+                    modes=None, cache=None, target_width=None):
+    """Загружает изображения со слайдера на странице и сохраняет их.
+
+    Браузер берется из пула pool, изображения скачиваются параллельно через fetcher.
+    Если они не переданы, создаются временные на одну страницу (браузер
+    запускается, только если страницу не удалось разобрать без него).
+    С cache (ImageCache) изображения перепроверяются условными запросами.
+    Возвращает путь к папке с изображениями или None.
+    """
+    if pool is None:
+        with BrowserPool(size=1) as own_pool:
+            return download_images(url, save_dir, pool=own_pool, fetcher=fetcher,
+                                   stability_window=stability_window, modes=modes, cache=cache,
+                                   target_width=target_width)
+    if fetcher is None:
+        with ImageFetcher() as own_fetcher:
+            return download_images(url, save_dir, pool=pool, fetcher=own_fetcher,
+                                   stability_window=stability_window, modes=modes, cache=cache,
+                                   target_width=target_width)
+
+    img_urls = collect_image_urls(url, pool, fetcher=fetcher, modes=modes,
+                                  stability_window=stability_window, target_width=target_width)
+    if not img_urls:
+        return None
+    return save_page_images(url, img_urls, save_dir, fetcher, cache=cache)
+
+def collect_image_urls(url, pool, fetcher=None, modes=None, stability_window=DEFAULT_STABILITY_WINDOW,
+                       target_width=None, raise_errors=False):
+    """Возвращает абсолютные URL изображений слайдера на странице.
+
+    Сначала пробуется быстрый путь: обычный HTTP-запрос через fetcher и разбор
+    HTML с SLIDER_SELECTOR. Браузер из пула используется, только если так
+    ничего не нашлось или домен уже помечен в modes как требующий браузера.
+    В браузере страница считается готовой, как только набор изображений
+    слайдера не меняется stability_window секунд. Из вариантов каждого
+    изображения (srcset, data-src, <picture>) выбирается самый маленький,
+    который не уже target_width; без target_width - data-src или src, как раньше.
+    Если страницу не удалось открыть в браузере, возвращается None, а при
+    raise_errors=True бросается TransientError, чтобы планировщик ее повторил.
+    """
+    if modes is None:
+        modes = _default_fetch_modes
     print(f"Обработка URL: {url}")
-    driver = None # Инициализируем driver
+
+    run_metrics = metrics.current()
+    image_tags = None
+    if fetcher is not None and modes.get(url) != MODE_BROWSER:
+        with run_metrics.span('page_static'):
+            image_tags = _find_static_images(fetcher, url)
+        if image_tags:
+            modes.remember(url, MODE_STATIC)
+            run_metrics.incr('pages_static')
+
+    if not image_tags:
+        try:
+            # Браузер нужен только для получения HTML: изображения качаем уже после его возврата в пул
+            with run_metrics.span('browser_lease'), pool.lease() as driver:
+                with run_metrics.span('page_render'):
+                    image_tags = _find_slider_images(driver, url, stability_window=stability_window)
+        except Exception as e:
+            print(f"Ошибка браузера при обработке {url}: {e}")
+            run_metrics.incr('pages_failed')
+            if raise_errors:
+                raise TransientError(f"браузер: {e}") from e
+            return None
+        if image_tags:
+            run_metrics.incr('pages_browser')
+            if fetcher is not None:
+                modes.remember(url, MODE_BROWSER)
+
+    if not image_tags:
+        print(f"Изображения не найдены на {url}")
+        run_metrics.incr('pages_no_images')
+        return None
+
+    # Из src, srcset, data-* и <picture> берется самый маленький вариант не уже target_width.
+    # None сохраняет позицию, чтобы нумерация файлов не сдвигалась; относительные URL становятся абсолютными.
+    img_urls = [select_image_url(img_tag, url, target_width=target_width) for img_tag in image_tags]
+
+    if not any(img_urls):
+        print(f"У изображений на {url} нет адресов для загрузки")
+        return None
+    return img_urls
+
+def _find_static_images(fetcher, url):
+    """Ищет изображения слайдера в исходном HTML без браузера (или возвращает None)."""
+    try:
+        response = fetcher.get(url)
+        soup = BeautifulSoup(response.text, 'html.parser')
+        image_tags = soup.select(SLIDER_SELECTOR)
+    except requests.exceptions.RequestException as e:
+        print(f"Ошибка при запросе страницы {url} без браузера: {e}")
+        return None
+    except Exception as e:
+        print(f"Ошибка разбора страницы {url} без браузера: {e}")
+        return None
+    if image_tags:
+        print("Элементы слайдера найдены в исходном HTML (браузер не нужен).")
+    return image_tags or None
+
+def page_folder_name(url):
+    """Имя подпапки для URL (используем часть URL или заголовок страницы)."""
+    # Простой вариант: использовать последние части URL
+    return re.sub(r'[^a-zA-Z0-9_\-]', '_', url.split('/')[-2] or url.split('/')[-1] or 'page')
+
+def save_page_images(url, img_urls, save_dir, fetcher, cache=None, manifest=None):
+    """Параллельно скачивает изображения страницы в ее подпапку и возвращает путь к ней.
+
+    Если передан cache (ImageCache), неизменившиеся изображения не скачиваются повторно.
+    Если передан manifest (RunManifest), в него записывается состояние страницы.
+    """
+    page_save_dir = os.path.join(save_dir, page_folder_name(url))
+    os.makedirs(page_save_dir, exist_ok=True)
+    print(f"Сохранение в папку: {page_save_dir}")
+
+    jobs = [(i, img_url, page_save_dir) for i, img_url in enumerate(img_urls) if img_url]
+    # Все изображения страницы скачиваются параллельно через общий пул соединений
+    with metrics.current().span('page_download'):
+        images = fetcher.map_wait(lambda job: _save_image(fetcher, *job, cache=cache), jobs)
+    images = [image for image in images if image]
+    metrics.current().incr('pages_done' if images else 'pages_failed')
+    if manifest is not None:
+        manifest.record_url(url, 'done' if images else 'failed', folder=page_save_dir, images=images)
+    return page_save_dir
+
+def _find_slider_images(driver, url, stability_window=DEFAULT_STABILITY_WINDOW):
+    """Открывает страницу в браузере и возвращает теги изображений слайдера (или None)."""
     try:
         # Используем Selenium для загрузки страницы
-        options = webdriver.ChromeOptions()
-        # options.add_argument('--headless') # Раскомментируйте для фонового режима
-        # Укажите путь к chromedriver, если он не в PATH
-        # driver = webdriver.Chrome(executable_path='/path/to/chromedriver', options=options)
-        driver = webdriver.Chrome(options=options)
         driver.get(url)
 
-        # Ждем, пока изображения в слайдере загрузятся (настраиваемое время и селектор)
-        wait_time = 10 # Секунд ожидания
-        # Используем селектор, подтвержденный через Puppeteer
-        slider_selector = 'div#masterslider_div img' # Более точный селектор для слайдера 
-        try:
-            WebDriverWait(driver, wait_time).until(
-                # Ждем присутствия хотя бы одного элемента, соответствующего селектору
-                EC.presence_of_element_located((By.CSS_SELECTOR, slider_selector))
-            )
+        # Ждем, пока набор изображений в слайдере перестанет меняться (настраиваемое время и селектор)
+        wait_time = DEFAULT_READY_TIMEOUT # Секунд ожидания
+        slider_selector = SLIDER_SELECTOR
+        with metrics.current().span('slider_wait'):
+            ready = wait_for_images_ready(driver, slider_selector, timeout=wait_time, stability_window=stability_window)
+        if ready:
             print("Элементы слайдера найдены.")
-            # Дополнительная пауза, если контент подгружается динамически после появления первого элемента
-            time.sleep(3) 
-        except TimeoutException:
-            print(f"Основные изображения ('{slider_selector}') не найдены или не загрузились за {wait_time} секунд на {url}")
-            # Попробуем найти любые изображения как запасной вариант
-            fallback_selector = 'img' 
-            try:
-                 WebDriverWait(driver, 5).until(
-                    # Используем fallback_selector для ожидания любых изображений
-                    EC.presence_of_element_located((By.CSS_SELECTOR, fallback_selector))
-                 )
-                 print("Найдены другие изображения (используется fallback_selector).")
-                 time.sleep(2)
-                 # Получаем HTML и парсим с fallback_selector
-                 page_source = driver.page_source
-                 soup = BeautifulSoup(page_source, 'html.parser')
-                 image_tags = soup.select(fallback_selector) # Используем fallback_selector
-            except TimeoutException:
-                 print(f"Вообще не найдено изображений (даже с fallback_selector='{fallback_selector}') на {url}")
-                 driver.quit()
-                 return
-        else:
-            # Этот блок выполняется, если основной WebDriverWait НЕ вызвал TimeoutException
             # Получаем HTML и парсим с основным slider_selector
             page_source = driver.page_source
             soup = BeautifulSoup(page_source, 'html.parser')
-            image_tags = soup.select(slider_selector) # Используем основной slider_selector
-
-        if not image_tags:
-            print(f"Изображения не найдены на {url}")
-            return
-
-        # Создаем подпапку для URL (используем часть URL или заголовок страницы)
-        # Простой вариант: использовать последние части URL
-        folder_name = re.sub(r'[^a-zA-Z0-9_\-]', '_', url.split('/')[-2] or url.split('/')[-1] or 'page')
-        page_save_dir = os.path.join(save_dir, folder_name)
-        os.makedirs(page_save_dir, exist_ok=True)
-        print(f"Сохранение в папку: {page_save_dir}")
-
-        for i, img_tag in enumerate(image_tags):
-            img_url = img_tag.get('src') # Или 'data-src', или другой атрибут
-            if not img_url:
-                continue
+            return soup.select(slider_selector) # Используем основной slider_selector
+
+        print(f"Основные изображения ('{slider_selector}') не найдены или не загрузились за {wait_time} секунд на {url}")
+        # Попробуем найти любые изображения как запасной вариант
+        fallback_selector = 'img' 
+        with metrics.current().span('slider_wait'):
+            ready = wait_for_images_ready(driver, fallback_selector, timeout=5, stability_window=stability_window)
+        if ready:
+            print("Найдены другие изображения (используется fallback_selector).")
+            # Получаем HTML и парсим с fallback_selector
+            page_source = driver.page_source
+            soup = BeautifulSoup(page_source, 'html.parser')
+            return soup.select(fallback_selector) # Используем fallback_selector
 
-            # Обработка относительных URL
-            if not img_url.startswith(('http://', 'https://')):
-                img_url = urljoin(url, img_url)
+        print(f"Вообще не найдено изображений (даже с fallback_selector='{fallback_selector}') на {url}")
+        return None
 
-            try:
-                img_response = requests.get(img_url)
-                img_response.raise_for_status()
-                img_data = BytesIO(img_response.content)
-                img = Image.open(img_data)
-
-                # Сохраняем изображение
-                img_filename = f"image_{i+1}.{img.format.lower() or 'jpg'}"
-                img_save_path = os.path.join(page_save_dir, img_filename)
-                with open(img_save_path, 'wb') as f:
-                    f.write(img_response.content)
-                print(f"Сохранено: {img_filename}")
-
-            except requests.exceptions.RequestException as e:
-                print(f"Ошибка загрузки изображения {img_url}: {e}")
-            except Exception as e:
-                 print(f"Ошибка обработки изображения {img_url}: {e}")
+    except WebDriverException:
+        raise # Таймаут загрузки или сбой браузера: решает вызывающий код (страницу можно повторить)
+    except Exception as e:
+        print(f"Непредвиденная ошибка при обработке {url}: {e}")
+        return None
+    # Браузер не закрываем: он возвращается в пул (упавшие браузеры пул перезапустит сам)
+
+def _save_image(fetcher, i, img_url, page_save_dir, cache=None):
+    """Скачивает одно изображение и сохраняет его как image_{i+1}.<формат>.
+
+    Тело ответа пишется на диск по частям во временный файл, формат
+    определяется по первым байтам (без декодирования через PIL), а готовый
+    файл атомарно переименовывается. С кешем отправляется условный запрос
+    (If-None-Match/If-Modified-Since): при ответе 304 файл берется из кеша.
+    Возвращает словарь image_url/file/sha256 или None при ошибке.
+    """
+    run_metrics = metrics.current()
+    tmp_path = os.path.join(page_save_dir, f".image_{i+1}.{threading.get_ident()}.part")
+    try:
+        entry = cache.lookup(img_url) if cache else None
+        with run_metrics.span('image_http'):
+            result = fetcher.download_to_file(img_url, tmp_path, headers=ImageCache.conditional_headers(entry))
+
+        if entry and result['status'] == 304:
+            img_filename = f"image_{i+1}.{entry['ext']}"
+            cache.link_into(entry, os.path.join(page_save_dir, img_filename))
+            print(f"Не изменилось, взято из кеша: {img_filename}")
+            run_metrics.incr('images_not_modified')
+            return {'image_url': img_url, 'file': os.path.join(page_save_dir, img_filename), 'sha256': entry['sha256']}
+
+        ext = sniff_image_format(result['head'], result['content_type'])
+        if not ext:
+            raise ValueError(f"ответ не похож на изображение (Content-Type: {result['content_type']})")
+
+        # Сохраняем изображение
+        img_filename = f"image_{i+1}.{ext}"
+        img_save_path = os.path.join(page_save_dir, img_filename)
+        if cache:
+            entry = cache.store_file(img_url, tmp_path, result['sha256'], result['size'], ext,
+                                     etag=result['etag'], last_modified=result['last_modified'])
+            cache.link_into(entry, img_save_path)
+        else:
+            os.replace(tmp_path, img_save_path)
+        print(f"Сохранено: {img_filename}")
+        run_metrics.incr('images_downloaded')
+        run_metrics.incr('bytes_downloaded', result['size'])
+        return {'image_url': img_url, 'file': img_save_path, 'sha256': result['sha256']}
 
     except requests.exceptions.RequestException as e:
-        print(f"Ошибка при запросе страницы или изображения {url}: {e}")
+        print(f"Ошибка загрузки изображения {img_url}: {e}")
+        run_metrics.incr('images_failed')
     except Exception as e:
-        print(f"Непредвиденная ошибка при обработке {url}: {e}")
+         print(f"Ошибка обработки изображения {img_url}: {e}")
+         run_metrics.incr('images_failed')
     finally:
-        if driver:
-            driver.quit() # Обязательно закрываем браузер
-
-def stitch_images(folder_path):
-    """Склеивает все изображения в папке вертикально, масштабируя по ширине."""
-    print(f"Склеивание изображений в папке: {folder_path}")
-    image_files = sorted([f for f in os.listdir(folder_path) if f.lower().endswith(('png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp'))])
-
-    if not image_files:
-        print("Нет изображений для склеивания.")
-        return
-
-    max_width = 0
-    images_data = [] # Список для хранения данных изображений: (путь, ширина, высота)
-
-    # --- Этап 1: Определение максимальной ширины и сбор данных ---
-    print("Этап 1: Определение максимальной ширины...")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def scan_image_metadata(folder_path):
+    """Строит индекс изображений папки за один проход, читая только заголовки файлов.
+
+    Image.open не декодирует пиксели, пока к ним не обратились, поэтому
+    размеры и формат получаются без полной распаковки. Возвращает список
+    словарей path/filename/width/height/format/size/mtime, отсортированный по имени.
+    """
+    image_files = sorted([f for f in os.listdir(folder_path) if f.lower().endswith(IMAGE_EXTENSIONS)])
+    index = []
     for filename in image_files:
         img_path = os.path.join(folder_path, filename)
         try:
+            stat = os.stat(img_path)
             with Image.open(img_path) as img:
-                print(f"  - Проверено {filename}: ширина={img.width}, высота={img.height}")
-                if img.width > max_width:
-                    max_width = img.width
-                images_data.append({'path': img_path, 'width': img.width, 'height': img.height})
+                index.append({'path': img_path, 'filename': filename, 'width': img.width, 'height': img.height,
+                              'format': img.format, 'size': stat.st_size, 'mtime': stat.st_mtime})
         except Exception as e:
             print(f"Ошибка открытия или чтения размеров изображения {filename}: {e}")
             continue # Пропускаем поврежденные или нечитаемые файлы
+    return index
+
+def folder_inputs_hash(folder_path, options=None):
+    """SHA-256 от имен и содержимого изображений папки (и параметров склейки options)."""
+    digest = hashlib.sha256(json.dumps(options or {}, sort_keys=True).encode('utf-8'))
+    image_files = sorted(f for f in os.listdir(folder_path) if f.lower().endswith(IMAGE_EXTENSIONS))
+    for filename in image_files:
+        digest.update(filename.encode('utf-8') + b'\0')
+        with open(os.path.join(folder_path, filename), 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def _load_tile(info, resample_mode):
+    """Декодирует изображение и масштабирует его до целевого размера для вставки."""
+    img = Image.open(info['path'])
+    target_size = (info['target_width'], info['target_height'])
+    if img.size == target_size:
+        # Вставляем оригинал без масштабирования
+        print(f"  - Вставка {os.path.basename(info['path'])} (оригинал)")
+        return img
+    print(f"  - Масштабирование {os.path.basename(info['path'])} до {target_size[0]}x{target_size[1]}")
+    use_draft, resample, reducing_gap = RESAMPLE_MODES[resample_mode]
+    if use_draft and img.format == 'JPEG' and img.width > info['target_width']:
+        # JPEG умеет декодироваться сразу в 1/2, 1/4 или 1/8 размера: меньше работы и памяти
+        img.draft('RGB', target_size)
+    try:
+        with metrics.current().span('stitch_decode_resize'):
+            return img.resize(target_size, resample, reducing_gap=reducing_gap)
+    finally:
+        img.close()
+
+def stitch_images(folder_path, max_part_pixels=DEFAULT_MAX_PART_PIXELS, resample_mode=DEFAULT_RESAMPLE_MODE,
+                  max_output_width=None, dedup_threshold=None):
+    """Склеивает все изображения в папке вертикально, масштабируя по ширине.
+
+    Ширина результата равна ширине самого широкого изображения, но не больше
+    max_output_width (если задана). resample_mode выбирает баланс
+    качества и скорости масштабирования: 'quality', 'balanced' или 'fast'.
+    Если результат больше max_part_pixels пикселей (или выше предела JPEG),
+    он сохраняется несколькими частями stitched_<папка>_partN.jpg.
+    Если задан dedup_threshold (например, DEFAULT_DEDUP_THRESHOLD), повторы
+    кадров (dHash отличается не больше чем на dedup_threshold бит, совпадение
+    подтверждено по миниатюрам) вставляются один раз; по умолчанию вставляются все.
+    Возвращает список путей к сохраненным файлам или None.
+    """
+    print(f"Склеивание изображений в папке: {folder_path}")
+    if resample_mode not in RESAMPLE_MODES:
+        print(f"Неизвестный режим масштабирования '{resample_mode}', используется '{DEFAULT_RESAMPLE_MODE}'.")
+        resample_mode = DEFAULT_RESAMPLE_MODE
 
+    # --- Этап 1: Индекс изображений (только заголовки) и максимальная ширина ---
+    print("Этап 1: Определение максимальной ширины...")
+    images_data = scan_image_metadata(folder_path)
     if not images_data:
-        print("Не удалось обработать ни одного изображения.")
+        print("Нет изображений для склеивания.")
         return
 
+    if dedup_threshold is not None and dedup_threshold >= 0:
+        with metrics.current().span('dedup'):
+            images_data, dropped = drop_duplicates(images_data, threshold=dedup_threshold)
+        for info, original, distance in dropped:
+            print(f"  - Пропущен повтор {info['filename']} (совпадает с {original['filename']}, различие {distance} бит)")
+
+    max_width = 0
+    for data in images_data:
+        print(f"  - Проверено {data['filename']}: ширина={data['width']}, высота={data['height']}")
+        if data['width'] > max_width:
+            max_width = data['width']
+    if max_output_width and max_width > max_output_width:
+        max_width = max_output_width
+
     print(f"-> Максимальная ширина определена: {max_width} пикселей")
 
     # --- Этап 2: Расчет итоговой высоты с учетом масштабирования ---
@@ -165,71 +379,143 @@ def stitch_images(folder_path):
             # Рассчитываем новую высоту, сохраняя пропорции
             ratio = max_width / original_width
             target_height = int(original_height * ratio)
-            print(f"  - Изображение {os.path.basename(data['path'])} будет масштабировано до {target_width}x{target_height}")
+            print(f"  - Изображение {data['filename']} будет масштабировано до {target_width}x{target_height}")
+        elif original_width > max_width:
+            # Изображение шире max_output_width: уменьшаем, высота меняется пропорционально
+            ratio = max_width / original_width
+            target_height = max(1, int(original_height * ratio))
+            print(f"  - Изображение {data['filename']} будет уменьшено до {target_width}x{target_height}")
         else:
-            # Если изображение шире или равно max_width, оно будет масштабировано до max_width
-            # (или оставлено как есть, если равно). Высота изменится пропорционально.
-            if original_width > max_width:
-                 ratio = max_width / original_width
-                 target_height = int(original_height * ratio)
-                 print(f"  - Изображение {os.path.basename(data['path'])} будет уменьшено до {target_width}x{target_height}")
-            else:
-                 # Ширина равна max_width, высота не меняется
-                 target_height = original_height
-                 print(f"  - Изображение {os.path.basename(data['path'])} имеет нужную ширину {target_width}x{target_height}")
+            # Ширина равна max_width, высота не меняется
+            print(f"  - Изображение {data['filename']} имеет нужную ширину {target_width}x{target_height}")
 
         actual_total_height += target_height
         processed_image_info.append({'path': data['path'], 'target_width': target_width, 'target_height': target_height})
 
     print(f"-> Итоговая расчетная высота: {actual_total_height} пикселей")
 
-    # --- Этап 3: Создание холста и вставка изображений ---
-    print("Этап 3: Создание холста и вставка изображений...")
-    try:
-        stitched_image = Image.new('RGB', (max_width, actual_total_height), (255, 255, 255))
-    except Exception as e:
-        print(f"Ошибка создания холста ({max_width}x{actual_total_height}): {e}")
-        return
+    # --- Этап 3: Вставка изображений в холсты-части и их сохранение ---
+    # Холст на всю высоту не создается: результат собирается горизонтальными частями
+    # высотой не больше part_height, и каждая часть сохраняется, как только заполнена.
+    # Так пиковая память пропорциональна одной части, а не всему изображению.
+    part_height = max(1, min(JPEG_MAX_DIMENSION, max_part_pixels // max_width))
+    part_count = -(-actual_total_height // part_height) # Округление вверх
+    print(f"Этап 3: Вставка изображений (частей: {part_count}, высота части до {part_height} пикселей)...")
+
+    base_name = f"stitched_{os.path.basename(folder_path)}"
+    saved_paths = []
+    part = {'top': 0, 'canvas': None}
+
+    def open_part():
+        height = min(part_height, actual_total_height - part['top'])
+        part['canvas'] = Image.new('RGB', (max_width, height), (255, 255, 255))
+
+    def save_part():
+        # --- Этап 4: Сохранение очередной части результата ---
+        canvas = part['canvas']
+        number = len(saved_paths) + 1
+        stitched_filename = f"{base_name}.jpg" if part_count == 1 else f"{base_name}_part{number}.jpg"
+        stitched_save_path = os.path.join(os.path.dirname(folder_path), stitched_filename)
+        try:
+            with metrics.current().span('stitch_encode'):
+                canvas.save(stitched_save_path, 'JPEG', quality=90)
+            print(f"-> Склеенное изображение сохранено: {stitched_save_path}")
+            saved_paths.append(stitched_save_path)
+        finally:
+            canvas.close()
+            part['top'] += canvas.height
+            part['canvas'] = None
 
     current_y = 0
-    for info in processed_image_info:
-        img_path = info['path']
-        target_width = info['target_width']
-        target_height = info['target_height']
-        try:
-            with Image.open(img_path) as img:
-                # Масштабируем, если необходимо (ширина не равна target_width или высота не равна target_height)
-                if img.width != target_width or img.height != target_height:
-                    print(f"  - Масштабирование {os.path.basename(img_path)} до {target_width}x{target_height}")
-                    img_resized = img.resize((target_width, target_height), Image.Resampling.LANCZOS)
-                    stitched_image.paste(img_resized, (0, current_y))
-                    img_resized.close() # Закрываем измененное изображение
-                else:
-                    # Вставляем оригинал без масштабирования
-                    print(f"  - Вставка {os.path.basename(img_path)} (оригинал)")
-                    stitched_image.paste(img, (0, current_y))
+    try:
+        open_part()
+        for info in processed_image_info:
+            img_path = info['path']
+            target_height = info['target_height']
+            try:
+                with _load_tile(info, resample_mode) as tile:
+                    # Изображение на границе частей вставляется в обе: PIL сам обрезает лишнее
+                    bottom = current_y + target_height
+                    while True:
+                        part['canvas'].paste(tile, (0, current_y - part['top']))
+                        if bottom < part['top'] + part['canvas'].height:
+                            break
+                        save_part()
+                        if part['top'] >= actual_total_height:
+                            break
+                        open_part()
+                        if bottom == part['top']:
+                            break
+
+                    current_y = bottom # Смещаем Y на высоту вставленного изображения
 
-                current_y += target_height # Смещаем Y на высоту вставленного изображения
+            except Exception as e:
+                print(f"Ошибка обработки/вставки изображения {os.path.basename(img_path)}: {e}")
+                # Можно добавить логику пропуска или остановки
+                continue
 
-        except Exception as e:
-            print(f"Ошибка обработки/вставки изображения {os.path.basename(img_path)}: {e}")
-            # Можно добавить логику пропуска или остановки
-            continue
-
-    # --- Этап 4: Сохранение результата ---
-    print("Этап 4: Сохранение результата...")
-    stitched_filename = f"stitched_{os.path.basename(folder_path)}.jpg"
-    stitched_save_path = os.path.join(os.path.dirname(folder_path), stitched_filename)
-    try:
-        stitched_image.save(stitched_save_path, 'JPEG', quality=90)
-        print(f"-> Склеенное изображение сохранено: {stitched_save_path}")
+        if part['canvas'] is not None:
+            save_part() # Последняя часть (незаполненный низ остается белым)
     except Exception as e:
         print(f"Ошибка сохранения склеенного изображения: {e}")
-    finally:
-        stitched_image.close()
-
-def run_scraping(urls, save_directory):
-    """Запускает процесс загрузки и склеивания изображений."""
+        if part['canvas'] is not None:
+            part['canvas'].close()
+
+    if saved_paths:
+        _remove_stale_parts(folder_path, base_name, saved_paths)
+    return saved_paths or None
+
+def _remove_stale_parts(folder_path, base_name, saved_paths):
+    """Удаляет части склейки от прошлых запусков, если число частей изменилось."""
+    parent_dir = os.path.dirname(folder_path)
+    pattern = re.compile(re.escape(base_name) + r'(_part\d+)?\.jpg$')
+    for filename in os.listdir(parent_dir or '.'):
+        path = os.path.join(parent_dir, filename)
+        if pattern.match(filename) and path not in saved_paths:
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"Не удалось удалить устаревшую часть склейки {filename}: {e}")
+
+def run_scraping(urls, save_directory, pool_size=DEFAULT_POOL_SIZE,
+                 max_pages_per_driver=DEFAULT_MAX_PAGES_PER_DRIVER,
+                 download_workers=DEFAULT_DOWNLOAD_WORKERS, per_host_limit=DEFAULT_PER_HOST_LIMIT,
+                 timeout=DEFAULT_TIMEOUT, queue_size=DEFAULT_QUEUE_SIZE,
+                 stability_window=DEFAULT_STABILITY_WINDOW, use_cache=True, cache_dir=None,
+                 cache_max_bytes=DEFAULT_CACHE_MAX_BYTES, max_part_pixels=DEFAULT_MAX_PART_PIXELS,
+                 resample_mode=DEFAULT_RESAMPLE_MODE, max_output_width=None, stitch_processes=None,
+                 use_manifest=True, report_path=None, profile_dir=None, target_width=None,
+                 progress_callback=None, dedup_threshold=None, scheduler=None):
+    """Запускает процесс загрузки и склеивания изображений.
+
+    Страницы обрабатываются параллельно pool_size браузерами из общего пула,
+    изображения всех страниц скачиваются через один ImageFetcher
+    (download_workers потоков, не больше per_host_limit запросов на хост).
+    Отрисовка, загрузка и склеивание связаны очередями по queue_size элементов.
+    При use_cache изображения кешируются в cache_dir (по умолчанию
+    <save_directory>/.image_cache) и при повторном запуске не скачиваются заново.
+    Склейки больше max_part_pixels пикселей сохраняются частями; resample_mode,
+    max_output_width и dedup_threshold (порог повторов кадров, None - не
+    искать) передаются в stitch_images. Из адаптивных вариантов изображений
+    загружается самый маленький не уже target_width (по умолчанию
+    max_output_width, до которой склейка все равно уменьшит). Склеивание идет
+    в пуле из stitch_processes процессов (по умолчанию по числу ядер).
+    При use_manifest ход работы пишется в <save_directory>/.manifest.jsonl:
+    прерванный запуск того же списка URL продолжается с места остановки,
+    а папки, входные изображения которых не изменились, не склеиваются заново.
+    Время этапов и счетчики пишутся в лог (logging) и в JSON-отчет report_path
+    (по умолчанию <save_directory>/run_report.json). Если задан profile_dir,
+    отрисовка и загрузка каждой страницы профилируются cProfile в файлы .prof
+    (профилируемые вызовы выполняются по одному, поэтому запуск идет медленнее).
+    progress_callback(событие) вызывается из рабочих потоков после каждого
+    этапа страницы; событие - словарь stage/url/done/total/counts, где done -
+    число страниц, обработка которых полностью завершена.
+    Страницы выдает scheduler (JobScheduler; если не передан, создается
+    новый): по приоритету, с повтором после временных ошибок и сроками задач.
+    Через него же запуск можно поставить на паузу или отменить из другого
+    потока; отмененный запуск продолжится с места остановки при следующем вызове.
+    Возвращает список путей к склеенным изображениям.
+    """
     if not urls:
         print("Список URL пуст.")
         return
@@ -240,24 +526,237 @@ def run_scraping(urls, save_directory):
 
     os.makedirs(save_directory, exist_ok=True)
 
-    # Шаг 1: Загрузка изображений
-    print("Начало загрузки изображений...")
-    for url in urls:
-        download_images(url, save_directory)
+    print(f"Начало обработки: загрузка и склеивание идут параллельно (браузеров в пуле: {pool_size})...")
+    modes = FetchModeMemory() # Какой способ получения страниц сработал на каждом домене в этом запуске
+    stitch_processes = max(1, stitch_processes or os.cpu_count() or 1)
+    target_width = target_width or max_output_width
+    run_metrics = metrics.start_run()
+    progress = _ProgressTracker(len(urls), progress_callback)
+    scheduler = scheduler or JobScheduler()
+    scheduler.add_many(urls)
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+    with BrowserPool(size=pool_size, max_pages_per_driver=max_pages_per_driver) as pool, \
+            ProcessPoolExecutor(max_workers=stitch_processes, mp_context=_stitch_mp_context()) as stitch_executor, \
+            ImageFetcher(max_workers=download_workers, per_host_limit=per_host_limit, timeout=timeout) as fetcher, \
+            _open_cache(save_directory, use_cache, cache_dir, cache_max_bytes) as cache, \
+            _open_manifest(save_directory, use_manifest) as manifest:
+        if manifest is not None and manifest.start_run(urls):
+            print("Найден прерванный запуск с тем же списком URL: продолжаем с места остановки.")
+
+        # Этапы конвейера работают одновременно: пока склеивается страница 1,
+        # браузеры уже открывают следующие. Ошибки обрабатываются внутри этапов.
+        def end_job(job, error):
+            """Сообщает планировщику об ошибке задачи; окончательно упавшая страница учитывается в прогрессе."""
+            if not scheduler.finish(job, error) and job.status in (FAILED, EXPIRED):
+                progress.update('failed', job.url)
+
+        def render(job):
+            url = job.url
+            try:
+                scheduler.checkpoint(job)
+                done_folder = manifest.completed_folder(url) if manifest is not None else None
+                if done_folder:
+                    print(f"Страница уже обработана в прерванном запуске, пропускаем загрузку: {url}")
+                    return (job, url, done_folder)
+                with run_metrics.span('render'):
+                    img_urls = _profiled(profile_dir, f"{page_folder_name(url)}.render", collect_image_urls,
+                                         url, pool, fetcher=fetcher, modes=modes, stability_window=stability_window,
+                                         target_width=target_width, raise_errors=True)
+                if not img_urls:
+                    if manifest is not None:
+                        manifest.record_url(url, 'no_images')
+                    scheduler.finish(job)
+                    progress.update('skipped', url)
+                    return None
+            except Exception as e:
+                end_job(job, e)
+                return None
+            progress.update('rendered', url)
+            return (job, url, img_urls)
 
-    print("\nЗагрузка изображений завершена.")
+        def download(page):
+            job, url, img_urls = page
+            try:
+                if isinstance(img_urls, str):
+                    folder_path = img_urls # Папка страницы, уже скачанной ранее
+                else:
+                    scheduler.checkpoint(job)
+                    folder_path = _profiled(profile_dir, f"{page_folder_name(url)}.download", save_page_images,
+                                            url, img_urls, save_directory, fetcher, cache=cache, manifest=manifest)
+                    if not any(f.lower().endswith(IMAGE_EXTENSIONS) for f in os.listdir(folder_path)):
+                        raise TransientError("не удалось скачать ни одного изображения")
+            except Exception as e:
+                end_job(job, e)
+                return None
+            scheduler.finish(job)
+            progress.update('downloaded', url)
+            return folder_path
+
+        def dropped(stage_name, item, error):
+            # Каждая выданная задача должна быть завершена, иначе планировщик будет ждать ее вечно
+            job = item if stage_name == 'render' else item[0] if stage_name == 'download' else None
+            if job is not None:
+                end_job(job, error or JobCancelled("запуск остановлен"))
+
+        stitch_options = {'max_part_pixels': max_part_pixels, 'resample_mode': resample_mode,
+                          'max_output_width': max_output_width, 'dedup_threshold': dedup_threshold}
+
+        def stitch(folder_path):
+            try:
+                scheduler.checkpoint()
+            except JobCancelled:
+                return None
+            inputs_hash = None
+            if manifest is not None:
+                inputs_hash = folder_inputs_hash(folder_path, stitch_options)
+                outputs = manifest.unchanged_outputs(folder_path, inputs_hash)
+                if outputs:
+                    print(f"Изображения в папке не изменились, склейка не нужна: {folder_path}")
+                    run_metrics.incr('folders_unchanged')
+                    progress.update('stitched', folder_path)
+                    return {'folder': folder_path, 'outputs': outputs, 'error': None}
+
+            # Поток этапа только ждет результата: само склеивание идет в отдельном процессе
+            result = stitch_executor.submit(_stitch_folder_task, folder_path, stitch_options).result()
+            run_metrics.merge(result.pop('metrics'))
+            log = result.pop('log') # Лог не храним в results, чтобы память не росла с числом страниц
+            if log:
+                print(log, end='')
+            if manifest is not None and not result['error']:
+                manifest.record_folder(folder_path, inputs_hash, result['outputs'])
+            progress.update('stitched', folder_path)
+            return result
+
+        results = run_pipeline(scheduler, [
+            Stage('render', render, workers=pool.size),
+            Stage('download', download, workers=pool.size),
+            Stage('stitch', stitch, workers=stitch_processes),
+        ], queue_size=queue_size, stop_event=scheduler.stop_event, on_drop=dropped)
+
+        # Отмененный запуск остается незавершенным в манифесте, чтобы его можно было продолжить
+        if manifest is not None and not scheduler.cancelled:
+            manifest.finish_run(urls)
+    progress.finish(cancelled=scheduler.cancelled)
+    if scheduler.cancelled:
+        print("\nЗапуск остановлен пользователем.")
+    print("Задачи по страницам: " + ', '.join(f"{status}={count}" for status, count in sorted(scheduler.summary().items())))
+
+    stitched = [path for result in results for path in result['outputs']] # Склейка может состоять из частей
+    report_path = report_path or os.path.join(save_directory, DEFAULT_REPORT_FILENAME)
+    try:
+        run_metrics.log_summary(run_metrics.write_report(report_path))
+        print(f"Отчет о запуске сохранен: {report_path}")
+    except OSError as e:
+        print(f"Не удалось сохранить отчет о запуске: {e}")
+    failed = [result for result in results if result['error']]
+    if failed:
+        print(f"\nНе удалось склеить папок: {len(failed)}")
+        for result in failed:
+            print(f"  - {result['folder']}: {result['error']}")
+
+    if not stitched:
+        print("\nНе найдено папок с загруженными изображениями для склеивания.")
+        return stitched
+
+    print(f"\nЗагрузка и склеивание изображений завершены (сохранено склеенных файлов: {len(stitched)}).")
+    return stitched
+
+class _ProgressTracker:
+    """Считает завершенные этапы страниц и сообщает о них в progress_callback."""
+
+    def __init__(self, total, callback):
+        self.total = total
+        self.callback = callback
+        self.counts = {'rendered': 0, 'downloaded': 0, 'stitched': 0, 'skipped': 0, 'failed': 0}
+        self._lock = threading.Lock()
+
+    def update(self, stage, item):
+        if self.callback is None:
+            return
+        with self._lock:
+            self.counts[stage] += 1
+            event = {'stage': stage, 'url': item, 'total': self.total, 'counts': dict(self.counts),
+                     'done': self.counts['stitched'] + self.counts['skipped'] + self.counts['failed']}
+        try:
+            self.callback(event)
+        except Exception as e:
+            print(f"Ошибка в обработчике прогресса: {e}")
 
-    # Шаг 2: Склеивание изображений
-    print("\nНачало склеивания изображений...")
-    all_subdirs = [os.path.join(save_directory, item) for item in os.listdir(save_directory) if os.path.isdir(os.path.join(save_directory, item))]
+    def finish(self, cancelled=False):
+        """Финальное событие: страницы, выпавшие из конвейера из-за ошибок, тоже считаются завершенными.
 
-    if not all_subdirs:
-        print("Не найдено папок с загруженными изображениями для склеивания.")
-        return
+        После отмены done остается числом действительно обработанных страниц.
+        """
+        if self.callback is None:
+            return
+        with self._lock:
+            done = self.counts['stitched'] + self.counts['skipped'] + self.counts['failed']
+            event = {'stage': 'cancelled' if cancelled else 'finished', 'url': None, 'total': self.total,
+                     'counts': dict(self.counts), 'done': done if cancelled else self.total}
+        try:
+            self.callback(event)
+        except Exception as e:
+            print(f"Ошибка в обработчике прогресса: {e}")
 
-    for item_path in all_subdirs:
-        stitch_images(item_path)
+def _stitch_folder_task(folder_path, options):
+    """Склеивает одну папку в процессе-воркере и возвращает результат родителю.
 
-    print("\nСклеивание изображений завершено.")
+    Вывод stitch_images собирается в строку и печатается родителем, чтобы
+    он попал в тот же лог (в том числе в окно GUI), что и остальные сообщения.
+    """
+    log = io.StringIO()
+    worker_metrics = metrics.start_run() # Замеры этого процесса вернутся родителю в result['metrics']
+    result = {'folder': folder_path, 'outputs': [], 'error': None}
+    try:
+        with redirect_stdout(log), worker_metrics.span('stitch_folder'):
+            result['outputs'] = stitch_images(folder_path, **options) or []
+    except Exception as e:
+        result['error'] = str(e)
+    if not result['outputs'] and not result['error']:
+        result['error'] = "нет сохраненных изображений"
+    worker_metrics.incr('stitched_files', len(result['outputs']))
+    # Воркер запущен через forkserver/spawn, и RUSAGE_CHILDREN родителя его не видит
+    worker_metrics.observe_max('stitch_worker_peak_rss_mb', metrics.peak_rss_mb())
+    result['log'] = log.getvalue()
+    result['metrics'] = worker_metrics.snapshot()
+    return result
+
+def _stitch_mp_context():
+    """Контекст процессов склеивания без fork.
+
+    Воркеры запускаются лениво, когда потоки браузеров, загрузки и GUI уже
+    работают; fork скопировал бы в дочерний процесс захваченные ими блокировки.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+def _profiled(profile_dir, name, func, *args, **kwargs):
+    """Вызывает func под cProfile и сохраняет статистику в profile_dir/<name>.prof (если profile_dir задан).
+
+    В процессе одновременно может работать только один профилировщик, поэтому
+    в режиме профилирования такие вызовы выполняются по очереди: этапы ждут
+    друг друга, зато профиль есть у каждой страницы.
+    """
+    if not profile_dir:
+        return func(*args, **kwargs)
+    with _profile_lock:
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            profiler.dump_stats(os.path.join(profile_dir, f"{name}.prof"))
+
+def _open_manifest(save_directory, use_manifest):
+    """Открывает манифест запусков для run_scraping (или пустой контекст, если он выключен)."""
+    if not use_manifest:
+        return nullcontext()
+    return RunManifest(os.path.join(save_directory, DEFAULT_MANIFEST_FILENAME))
+
+def _open_cache(save_directory, use_cache, cache_dir, cache_max_bytes):
+    """Открывает кеш изображений для run_scraping (или пустой контекст, если кеш выключен)."""
+    if not use_cache:
+        return nullcontext()
+    return ImageCache(cache_dir or os.path.join(save_directory, DEFAULT_CACHE_DIRNAME), max_bytes=cache_max_bytes)
 
 # Блок if __name__ == "__main__" удален, чтобы скрипт можно было импортировать
\ No newline at end of file
@@ -0,0 +1,119 @@
+import re
+from urllib.parse import urljoin
+
+# Атрибуты, в которых ленивые загрузчики (в том числе MasterSlider) держат настоящий адрес
+LAZY_SRC_ATTRIBUTES = ('data-src', 'data-lazy-src', 'data-original', 'data-lazy', 'data-full-src')
+LAZY_SRCSET_ATTRIBUTES = ('data-srcset', 'data-lazy-srcset')
+# Форматы <source type="...">, которые умеем сохранять и склеивать
+SUPPORTED_SOURCE_TYPES = ('image/jpeg', 'image/jpg', 'image/png', 'image/webp', 'image/gif', 'image/bmp')
+# Заглушки, которые стоят в src, пока изображение не подгружено: data:-URI или файл
+# с именем ровно blank.gif, spacer.png и т.п. (pixelfont_specimen.png заглушкой не считается)
+_PLACEHOLDER_RE = re.compile(r'(^data:)|(^|/)(blank|spacer|placeholder|transparent|pixel|1x1|empty|clear)'
+                             r'\.(gif|png|svg)($|[?#])', re.I)
+# Кандидаты srcset разделяет запятая с пробелом после нее или сразу после дескриптора ("300w,m.jpg")
+_SRCSET_SPLIT_RE = re.compile(r',\s+|(?<=\d[wxWX]),')
+_DESCRIPTOR_RE = re.compile(r'^(\d+(?:\.\d+)?)([wx])$', re.I)
+
+
+def is_placeholder(url):
+    """Похож ли адрес на заглушку ленивой загрузки (data:-URI, blank.gif и т.п.)."""
+    return bool(url) and bool(_PLACEHOLDER_RE.search(url.strip()))
+
+
+def parse_srcset(value):
+    """Разбирает srcset в список (адрес, ширина в px или None, плотность или None)."""
+    candidates = []
+    if not value:
+        return candidates
+    # Запятая без пробела внутри самого URL кандидатов не разделяет (в URL запятые тоже бывают)
+    for item in _SRCSET_SPLIT_RE.split(value.strip()):
+        parts = item.strip().split()
+        if not parts:
+            continue
+        url, width, density = parts[0].rstrip(','), None, None
+        if len(parts) > 1:
+            match = _DESCRIPTOR_RE.match(parts[1])
+            if match:
+                number = float(match.group(1))
+                if match.group(2).lower() == 'w':
+                    width = int(number)
+                else:
+                    density = number
+        candidates.append((url, width, density))
+    return candidates
+
+
+def _int_attr(tag, name):
+    try:
+        return int(str(tag.get(name, '')).strip().rstrip('px'))
+    except ValueError:
+        return None
+
+
+def image_candidates(img_tag):
+    """Все варианты адреса изображения: srcset, <picture><source>, data-* и src.
+
+    Возвращает список (адрес, ширина в px или None, плотность или None).
+    Заглушки ленивой загрузки отбрасываются, только если есть другие
+    варианты: единственный адрес изображения не теряется никогда.
+    """
+    base_width = _int_attr(img_tag, 'width') or _int_attr(img_tag, 'data-width')
+    srcsets = [img_tag.get(attr) for attr in LAZY_SRCSET_ATTRIBUTES + ('srcset',)]
+    parent = img_tag.parent
+    if parent is not None and parent.name == 'picture':
+        for source in parent.find_all('source'):
+            source_type = (source.get('type') or '').lower()
+            if source_type and source_type not in SUPPORTED_SOURCE_TYPES:
+                continue # Например, AVIF: сохранить можно, но склеить нельзя
+            srcsets.append(source.get('data-srcset') or source.get('srcset'))
+
+    candidates = []
+    for srcset in srcsets:
+        for url, width, density in parse_srcset(srcset):
+            if width is None and density is not None and base_width:
+                width = int(base_width * density)
+            candidates.append((url, width, density))
+
+    # Атрибут width у <img> - размер на странице, а не самого файла, поэтому ширину src не угадываем
+    for attr in LAZY_SRC_ATTRIBUTES + ('src',):
+        url = img_tag.get(attr)
+        if url:
+            candidates.append((url.strip(), None, None))
+
+    candidates = [candidate for candidate in candidates if candidate[0]]
+    real = [candidate for candidate in candidates if not is_placeholder(candidate[0])]
+    return real or candidates
+
+
+def select_image_url(img_tag, page_url, target_width=None):
+    """Выбирает адрес изображения для загрузки и возвращает его абсолютным (или None).
+
+    Без target_width качается тот же адрес, что и раньше: data-* (настоящий
+    при ленивой загрузке) или src, а srcset используется, только если их нет
+    (тогда берется самый широкий вариант). С target_width из вариантов
+    известной ширины берется самый маленький, который не уже target_width
+    (когда таких нет - самый широкий); если ширины неизвестны, предпочитается
+    data-*, затем вариант srcset с наибольшей плотностью, затем src.
+    """
+    candidates = image_candidates(img_tag)
+    if not candidates:
+        return None
+
+    lazy = [img_tag.get(attr).strip() for attr in LAZY_SRC_ATTRIBUTES
+            if img_tag.get(attr) and not is_placeholder(img_tag.get(attr))]
+    src = (img_tag.get('src') or '').strip()
+    plain = lazy + ([src] if src and not is_placeholder(src) else [])
+    sized = [(width, url) for url, width, _ in candidates if width]
+    if not target_width and plain:
+        chosen = plain[0] # Не качаем вариант крупнее, чем src, если размер склейки не ограничен
+    elif sized:
+        if target_width:
+            wide_enough = [item for item in sized if item[0] >= target_width]
+            chosen = min(wide_enough)[1] if wide_enough else max(sized)[1]
+        else:
+            chosen = max(sized)[1]
+    else:
+        dense = sorted((density, url) for url, _, density in candidates if density)
+        chosen = lazy[0] if lazy else dense[-1][1] if dense else candidates[-1][0]
+
+    return urljoin(page_url, chosen)
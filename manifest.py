@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# --- Настройки манифеста по умолчанию ---
+DEFAULT_MANIFEST_FILENAME = '.manifest.jsonl' # Файл манифеста внутри папки сохранения
+# ---
+
+
+def urls_key(urls):
+    """Отпечаток списка URL: по нему запуск узнает свой прерванный предшественник."""
+    return hashlib.sha256('\n'.join(urls).encode('utf-8')).hexdigest()
+
+
+def file_fingerprint(path):
+    """Дешевый отпечаток готового файла (размер и время изменения)."""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class RunManifest:
+    """Журнал запусков run_scraping в формате JSONL (одна запись на строку).
+
+    Записи только дописываются, поэтому прерванный запуск ничего не портит:
+    при загрузке более поздние записи перекрывают ранние. Хранятся:
+      - run: начало/конец запуска для конкретного списка URL;
+      - url: состояние страницы и ее изображений (адрес, файл, SHA-256);
+      - folder: хеш входных изображений папки и отпечатки склеенных файлов.
+    Пути хранятся относительно папки манифеста.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.base_dir = os.path.dirname(path)
+        self._lock = threading.Lock()
+        self._runs = {} # urls_key -> последняя запись run
+        self._urls = {} # (run_id, url) -> последняя запись url
+        self._folders = {} # папка -> последняя запись folder
+        self.run_id = None
+        self.resumed = False
+        self._load()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue # Недописанная строка от прерванного запуска
+            kind = record.get('type')
+            if kind == 'run':
+                self._runs[record['urls_key']] = record
+            elif kind == 'url':
+                self._urls[(record['run_id'], record['url'])] = record
+            elif kind == 'folder':
+                self._folders[record['folder']] = record
+
+    def _append(self, record):
+        record['time'] = time.time()
+        with self._lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._file.flush()
+
+    def _rel(self, path):
+        return os.path.relpath(path, self.base_dir)
+
+    def _abs(self, path):
+        return os.path.join(self.base_dir, path)
+
+    def start_run(self, urls):
+        """Начинает запуск; если такой же список URL не был доработан, продолжает его."""
+        key = urls_key(urls)
+        previous = self._runs.get(key)
+        if previous and previous['status'] != 'finished':
+            self.run_id = previous['run_id']
+            self.resumed = True
+        else:
+            self.run_id = f"{int(time.time())}-{key[:8]}"
+            self.resumed = False
+        record = {'type': 'run', 'run_id': self.run_id, 'urls_key': key, 'status': 'started', 'urls': len(urls)}
+        self._runs[key] = record
+        self._append(dict(record))
+        return self.resumed
+
+    def finish_run(self, urls):
+        record = {'type': 'run', 'run_id': self.run_id, 'urls_key': urls_key(urls), 'status': 'finished'}
+        self._runs[record['urls_key']] = record
+        self._append(dict(record))
+
+    def completed_folder(self, url):
+        """Папка страницы, если она уже обработана в продолжаемом запуске (иначе None)."""
+        record = self._urls.get((self.run_id, url))
+        if record and record['status'] == 'done' and os.path.isdir(self._abs(record['folder'])):
+            return self._abs(record['folder'])
+        return None
+
+    def record_url(self, url, status, folder=None, images=None):
+        """Сохраняет состояние страницы: done, failed или no_images."""
+        record = {'type': 'url', 'run_id': self.run_id, 'url': url, 'status': status,
+                  'folder': self._rel(folder) if folder else None,
+                  'images': [dict(image, file=self._rel(image['file'])) for image in images or []]}
+        with self._lock:
+            self._urls[(self.run_id, url)] = record
+        self._append(dict(record))
+
+    def unchanged_outputs(self, folder, inputs_hash):
+        """Склеенные файлы папки, если входы не менялись и результаты на месте (иначе None)."""
+        record = self._folders.get(self._rel(folder))
+        if not record or record['inputs_hash'] != inputs_hash or not record['outputs']:
+            return None
+        outputs = []
+        for output, fingerprint in record['outputs'].items():
+            path = self._abs(output)
+            if not os.path.exists(path) or file_fingerprint(path) != fingerprint:
+                return None
+            outputs.append(path)
+        return outputs
+
+    def record_folder(self, folder, inputs_hash, outputs):
+        record = {'type': 'folder', 'folder': self._rel(folder), 'inputs_hash': inputs_hash,
+                  'outputs': {self._rel(path): file_fingerprint(path) for path in outputs}}
+        with self._lock:
+            self._folders[record['folder']] = record
+        self._append(dict(record))
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,148 @@
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError: # Windows: пиковый RSS не замеряется
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# --- Настройки отчета по умолчанию ---
+DEFAULT_REPORT_FILENAME = 'run_report.json' # Файл отчета внутри папки сохранения
+# ---
+
+
+def _percentile(sorted_values, fraction):
+    """Перцентиль по ближайшему рангу для уже отсортированного списка."""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class RunMetrics:
+    """Замеры времени по этапам и счетчики одного запуска.
+
+    span(этап) измеряет длительность блока, incr(счетчик, n) накапливает
+    количества (байты, изображения, страницы), observe_max(имя, значение)
+    хранит максимум (например, пиковую память воркеров). Замеры из процессов-воркеров
+    переносятся в родительский процесс через snapshot()/merge().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans = defaultdict(list)
+        self._counters = defaultdict(int)
+        self._maxima = {}
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self._spans[stage].append(seconds)
+        logger.debug("этап %s: %.3f с", stage, seconds)
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def observe_max(self, name, value):
+        if value is None:
+            return
+        with self._lock:
+            self._maxima[name] = max(value, self._maxima.get(name, value))
+
+    def snapshot(self):
+        with self._lock:
+            return {'spans': {stage: list(values) for stage, values in self._spans.items()},
+                    'counters': dict(self._counters), 'maxima': dict(self._maxima)}
+
+    def merge(self, snapshot):
+        with self._lock:
+            for stage, values in snapshot.get('spans', {}).items():
+                self._spans[stage].extend(values)
+            for name, value in snapshot.get('counters', {}).items():
+                self._counters[name] += value
+            for name, value in snapshot.get('maxima', {}).items():
+                self._maxima[name] = max(value, self._maxima.get(name, value))
+
+    def report(self):
+        """Сводка запуска: по каждому этапу число замеров, сумма, p50/p95/max, плюс счетчики и скорости."""
+        wall = time.perf_counter() - self._started
+        with self._lock:
+            spans = {stage: sorted(values) for stage, values in self._spans.items()}
+            counters = dict(self._counters)
+            maxima = dict(self._maxima)
+        stages = {}
+        for stage, values in sorted(spans.items()):
+            stages[stage] = {
+                'count': len(values),
+                'total_s': round(sum(values), 4),
+                'p50_s': round(_percentile(values, 0.50), 4),
+                'p95_s': round(_percentile(values, 0.95), 4),
+                'max_s': round(values[-1], 4),
+            }
+        throughput = {}
+        if wall > 0:
+            throughput = {
+                'pages_per_s': round(counters.get('pages_done', 0) / wall, 3),
+                'images_per_s': round(counters.get('images_downloaded', 0) / wall, 3),
+                'download_mb_per_s': round(counters.get('bytes_downloaded', 0) / wall / 1024 ** 2, 3),
+            }
+        return {'started_at': self.started_at, 'wall_time_s': round(wall, 3), 'stages': stages,
+                'counters': counters, 'maxima': maxima, 'throughput': throughput}
+
+    def log_summary(self, report=None):
+        report = report or self.report()
+        logger.info("Запуск занял %.1f с; %s", report['wall_time_s'],
+                    ', '.join(f"{k}={v}" for k, v in sorted(report['counters'].items())))
+        for stage, stats in report['stages'].items():
+            logger.info("  %-20s n=%-5d сумма=%.2f с p50=%.3f с p95=%.3f с", stage, stats['count'],
+                        stats['total_s'], stats['p50_s'], stats['p95_s'])
+
+    def write_report(self, path):
+        report = self.report()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+        return report
+
+
+def peak_rss_mb():
+    """Пиковый RSS текущего процесса в МБ (None, если модуля resource нет)."""
+    if resource is None:
+        return None
+    unit = 1 if sys.platform == 'darwin' else 1024 # На macOS ru_maxrss в байтах, на Linux в КБ
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit / 1024 ** 2, 1)
+
+
+_current = RunMetrics()
+
+
+def current():
+    """Метрики текущего запуска (в процессе-воркере - его собственные)."""
+    return _current
+
+
+def start_run():
+    """Начинает сбор метрик нового запуска и возвращает их."""
+    global _current
+    _current = RunMetrics()
+    return _current
@@ -0,0 +1,113 @@
+import queue
+import threading
+
+# --- Настройки конвейера по умолчанию ---
+DEFAULT_QUEUE_SIZE = 4 # Элементов в очереди между соседними этапами
+# ---
+
+_DONE = object() # Маркер конца потока элементов для воркеров этапа
+
+
+class Stage:
+    """Этап конвейера: func(элемент) -> результат для следующего этапа.
+
+    Если func возвращает None, элемент дальше не передается.
+    """
+
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+
+
+def run_pipeline(items, stages, queue_size=DEFAULT_QUEUE_SIZE, stop_event=None, on_drop=None):
+    """Прогоняет items через этапы stages, которые работают одновременно.
+
+    Этапы связаны ограниченными очередями размера queue_size, поэтому
+    в памяти одновременно находится лишь несколько элементов, сколько бы
+    их ни было во входном списке. Если выставлен stop_event
+    (threading.Event), новые элементы больше не подаются, а уже стоящие
+    в очередях отбрасываются без обработки. on_drop(имя этапа, элемент,
+    ошибка) вызывается для каждого элемента, не прошедшего этап: этап бросил
+    исключение (ошибка - это исключение) или элемент отброшен после остановки
+    (ошибка None). Возвращает список результатов последнего этапа
+    (в порядке завершения).
+    """
+    if not stages:
+        return list(items)
+
+    queues = [queue.Queue(maxsize=max(1, int(queue_size))) for _ in stages]
+    results = []
+    results_lock = threading.Lock()
+    threads = []
+
+    def drop(stage, item, error):
+        if on_drop is None:
+            return
+        try:
+            on_drop(stage.name, item, error)
+        except Exception as e:
+            print(f"Ошибка в обработчике отброшенного элемента этапа '{stage.name}': {e}")
+
+    def feed():
+        try:
+            for item in items:
+                if stop_event is not None and stop_event.is_set():
+                    drop(stages[0], item, None) # Элемент уже взят из источника, но обработан не будет
+                    break
+                queues[0].put(item)
+        finally:
+            for _ in range(stages[0].workers):
+                queues[0].put(_DONE)
+
+    def make_worker(index, stage, remaining):
+        inbox = queues[index]
+        is_last = index == len(stages) - 1
+
+        def worker():
+            try:
+                while True:
+                    item = inbox.get()
+                    if item is _DONE:
+                        break
+                    if stop_event is not None and stop_event.is_set():
+                        drop(stage, item, None)
+                        continue # Запуск остановлен: дочитываем очередь до маркера конца
+                    try:
+                        result = stage.func(item)
+                    except Exception as e:
+                        print(f"Ошибка на этапе '{stage.name}': {e}")
+                        drop(stage, item, e)
+                        continue
+                    if result is None:
+                        continue
+                    if is_last:
+                        with results_lock:
+                            results.append(result)
+                    else:
+                        queues[index + 1].put(result)
+            finally:
+                # Последний завершившийся воркер этапа сообщает следующему этапу о конце данных
+                with remaining['lock']:
+                    remaining['count'] -= 1
+                    finished = remaining['count'] == 0
+                if finished and not is_last:
+                    for _ in range(stages[index + 1].workers):
+                        queues[index + 1].put(_DONE)
+        return worker
+
+    for index, stage in enumerate(stages):
+        remaining = {'count': stage.workers, 'lock': threading.Lock()}
+        for n in range(stage.workers):
+            thread = threading.Thread(target=make_worker(index, stage, remaining),
+                                      name=f"{stage.name}-{n + 1}", daemon=True)
+            threads.append(thread)
+
+    feeder = threading.Thread(target=feed, name="pipeline-feed", daemon=True)
+    feeder.start()
+    for thread in threads:
+        thread.start()
+    feeder.join()
+    for thread in threads:
+        thread.join()
+    return results
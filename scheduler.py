@@ -0,0 +1,282 @@
+import heapq
+import itertools
+import threading
+import time
+
+import metrics
+
+# --- Настройки планировщика по умолчанию ---
+DEFAULT_MAX_ATTEMPTS = 3 # Попыток на страницу (первая + повторы после временных ошибок)
+DEFAULT_BACKOFF_BASE = 2.0 # Секунд до первого повтора, дальше задержка удваивается
+DEFAULT_BACKOFF_MAX = 60.0 # Максимальная задержка между повторами
+DEFAULT_JOB_TIMEOUT = None # Секунд на страницу с первой попытки (None - без ограничения)
+# ---
+
+# Состояния задачи
+PENDING = 'pending'
+RUNNING = 'running'
+RETRY_WAIT = 'retry_wait'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+EXPIRED = 'expired'
+FINAL_STATES = (DONE, FAILED, CANCELLED, EXPIRED)
+
+
+class TransientError(Exception):
+    """Временная ошибка (сеть, браузер): страницу имеет смысл повторить позже."""
+
+
+class JobCancelled(Exception):
+    """Задача отменена пользователем; бросается из JobScheduler.checkpoint()."""
+
+
+class JobDeadlineExceeded(JobCancelled):
+    """У задачи истек срок выполнения."""
+
+
+class Job:
+    """Задача обработки одного URL."""
+
+    def __init__(self, url, priority=0, timeout=None, deadline=None):
+        self.url = url
+        self.priority = priority # Больше - раньше
+        self.timeout = timeout # Секунд с начала первой попытки
+        self.deadline = deadline # Абсолютное время (time.time()), после которого задача не нужна
+        self.status = PENDING
+        self.attempts = 0
+        self.started_at = None
+        self.not_before = 0.0 # Раньше этого момента повтор не запускается
+        self.last_error = None
+        self.cancel_requested = False
+        self._entry = None # Актуальная запись в куче (устаревшие после смены приоритета пропускаются)
+
+    def effective_deadline(self):
+        deadlines = [d for d in (self.deadline,
+                                 self.started_at + self.timeout if self.timeout and self.started_at else None)
+                     if d is not None]
+        return min(deadlines) if deadlines else None
+
+    def expired(self, now=None):
+        deadline = self.effective_deadline()
+        return deadline is not None and (now or time.time()) > deadline
+
+    def __repr__(self):
+        return f"Job({self.url!r}, priority={self.priority}, status={self.status}, attempts={self.attempts})"
+
+
+class JobScheduler:
+    """Очередь задач по URL с приоритетами, повторами, паузой и отменой.
+
+    Итерация по планировщику выдает задачи в порядке приоритета (при равном -
+    в порядке добавления) и блокируется, пока стоит пауза или пока задачи,
+    ожидающие повтора, еще не готовы. Итерация заканчивается, когда все задачи
+    завершены или запуск отменен через cancel(). Исполнитель обязан сообщить
+    о результате каждой выданной задачи через finish(job, error); при
+    TransientError задача возвращается в очередь с экспоненциальной задержкой
+    backoff_base * 2**(попытка-1), но не больше backoff_max, пока не исчерпано
+    max_attempts попыток и не истек срок задачи. Незавершенная задача держит
+    итерацию открытой, поэтому с run_pipeline нужен on_drop, завершающий
+    задачи, которые этап не обработал (исключение или остановка запуска).
+
+    Отмена кооперативная: уже начатые операции (загрузка страницы браузером,
+    скачивание изображений) не прерываются, а этапы проверяют состояние через
+    checkpoint() перед каждым шагом. Методы можно вызывать из любого потока.
+    """
+
+    def __init__(self, max_attempts=DEFAULT_MAX_ATTEMPTS, backoff_base=DEFAULT_BACKOFF_BASE,
+                 backoff_max=DEFAULT_BACKOFF_MAX, job_timeout=DEFAULT_JOB_TIMEOUT):
+        self.max_attempts = max(1, int(max_attempts))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.job_timeout = job_timeout
+        self.stop_event = threading.Event() # Выставляется при отмене всего запуска
+        self._cond = threading.Condition()
+        self._jobs = {}
+        self._heap = []
+        self._waiting = [] # Задачи, ожидающие повтора
+        self._running = 0
+        self._paused = False
+        self._seq = itertools.count()
+
+    # --- Управление очередью ---
+
+    def add(self, url, priority=0, timeout=None, deadline=None):
+        """Добавляет задачу для url (или возвращает уже существующую) и возвращает ее."""
+        with self._cond:
+            job = self._jobs.get(url)
+            if job is None:
+                job = Job(url, priority, timeout if timeout is not None else self.job_timeout, deadline)
+                self._jobs[url] = job
+                self._push(job)
+                self._cond.notify_all()
+            return job
+
+    def add_many(self, urls, priority=0):
+        return [self.add(url, priority) for url in urls]
+
+    def set_priority(self, url, priority):
+        """Меняет приоритет задачи, которая еще не начата или ждет повтора."""
+        with self._cond:
+            job = self._jobs.get(url)
+            if job is None or job.status not in (PENDING, RETRY_WAIT):
+                return False
+            job.priority = priority
+            if job.status == PENDING:
+                self._push(job)
+            self._cond.notify_all()
+            return True
+
+    def cancel(self, url=None):
+        """Отменяет задачу url или, без аргумента, весь запуск."""
+        with self._cond:
+            jobs = [self._jobs[url]] if url is not None and url in self._jobs else []
+            if url is None:
+                self.stop_event.set()
+                jobs = list(self._jobs.values())
+            for job in jobs:
+                job.cancel_requested = True
+                if job.status in (PENDING, RETRY_WAIT):
+                    self._set_final(job, CANCELLED)
+            self._cond.notify_all()
+
+    def pause(self):
+        with self._cond:
+            self._paused = True
+
+    def resume(self):
+        with self._cond:
+            self._paused = False
+            self._cond.notify_all()
+
+    @property
+    def paused(self):
+        return self._paused
+
+    @property
+    def cancelled(self):
+        return self.stop_event.is_set()
+
+    def jobs(self):
+        with self._cond:
+            return list(self._jobs.values())
+
+    def summary(self):
+        """Число задач в каждом состоянии."""
+        counts = {}
+        with self._cond:
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    # --- Выдача задач исполнителю ---
+
+    def __iter__(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                if job is None:
+                    return
+            yield job
+
+    def _next_job(self):
+        """Ждет и выдает следующую готовую задачу (None - задач больше не будет)."""
+        while True:
+            if self.stop_event.is_set():
+                return None
+            delay = None
+            if not self._paused:
+                now = time.time()
+                job, delay = self._pop_ready(now)
+                if job is not None:
+                    job.status = RUNNING
+                    job.attempts += 1
+                    if job.started_at is None:
+                        job.started_at = now
+                    self._running += 1
+                    return job
+                if delay is None and self._running == 0:
+                    return None # Очередь пуста и повторов не будет
+            self._cond.wait(delay)
+
+    def _pop_ready(self, now):
+        # Задачи, у которых подошло время повтора, возвращаются в кучу
+        still_waiting = []
+        for job in self._waiting:
+            if job.status != RETRY_WAIT:
+                continue
+            if job.not_before <= now:
+                job.status = PENDING
+                self._push(job)
+            else:
+                still_waiting.append(job)
+        self._waiting = still_waiting
+
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            job = entry[2]
+            if entry is not job._entry or job.status != PENDING:
+                continue # Устаревшая запись или задача уже отменена
+            if job.expired(now):
+                print(f"Истек срок задачи, страница пропущена: {job.url}")
+                self._set_final(job, EXPIRED)
+                continue
+            return job, None
+
+        delay = min((job.not_before - now for job in self._waiting), default=None)
+        return None, (max(0.0, delay) if delay is not None else None)
+
+    def _push(self, job):
+        job._entry = (-job.priority, next(self._seq), job)
+        heapq.heappush(self._heap, job._entry)
+
+    def _set_final(self, job, status):
+        job.status = status
+        metrics.current().incr(f'jobs_{status}')
+
+    # --- Сообщения исполнителя ---
+
+    def checkpoint(self, job=None):
+        """Ждет, пока стоит пауза; бросает JobCancelled, если запуск или задача отменены или срок истек."""
+        with self._cond:
+            while self._paused and not self.stop_event.is_set():
+                self._cond.wait()
+        if self.stop_event.is_set() or (job is not None and job.cancel_requested):
+            raise JobCancelled("задача отменена")
+        if job is not None and job.expired():
+            raise JobDeadlineExceeded(f"истек срок задачи {job.url}")
+
+    def finish(self, job, error=None):
+        """Сообщает результат попытки. Возвращает True, если задача будет повторена."""
+        with self._cond:
+            if job.status != RUNNING:
+                return False
+            self._running -= 1
+            self._cond.notify_all()
+            job.last_error = error
+            if error is None:
+                self._set_final(job, DONE)
+                return False
+            if isinstance(error, JobDeadlineExceeded):
+                print(f"Истек срок задачи {job.url}")
+                self._set_final(job, EXPIRED)
+                return False
+            if isinstance(error, JobCancelled) or job.cancel_requested or self.stop_event.is_set():
+                self._set_final(job, CANCELLED)
+                return False
+            if not isinstance(error, TransientError) or job.attempts >= self.max_attempts:
+                self._set_final(job, FAILED)
+                return False
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (job.attempts - 1))
+            deadline = job.effective_deadline()
+            if deadline is not None and time.time() + delay > deadline:
+                print(f"Повтор {job.url} не успеет до истечения срока, задача завершена.")
+                self._set_final(job, EXPIRED)
+                return False
+            print(f"Временная ошибка на {job.url} ({error}); повтор {job.attempts + 1}/{self.max_attempts} "
+                  f"через {delay:.1f} с")
+            metrics.current().incr('jobs_retried')
+            job.status = RETRY_WAIT
+            job.not_before = time.time() + delay
+            self._waiting.append(job)
+            return True
@@ -0,0 +1,60 @@
+import time
+
+from selenium.common.exceptions import WebDriverException
+
+# --- Настройки ожидания готовности слайдера по умолчанию ---
+DEFAULT_READY_TIMEOUT = 10 # Секунд ожидания появления изображений
+DEFAULT_STABILITY_WINDOW = 0.3 # Секунд, в течение которых набор изображений не должен меняться
+DEFAULT_POLL_INTERVAL = 0.1 # Секунд между опросами страницы
+# ---
+
+# Возвращает адреса всех изображений по селектору и признак того, что все они догрузились
+_SNAPSHOT_SCRIPT = """
+var imgs = document.querySelectorAll(arguments[0]);
+var srcs = [];
+var complete = true;
+for (var i = 0; i < imgs.length; i++) {
+    srcs.push(imgs[i].currentSrc || imgs[i].src || '');
+    if (!imgs[i].complete) { complete = false; }
+}
+return [srcs, complete];
+"""
+
+
+def _snapshot(driver, selector):
+    try:
+        srcs, complete = driver.execute_script(_SNAPSHOT_SCRIPT, selector)
+        return tuple(srcs), bool(complete)
+    except WebDriverException:
+        # Страница может перезагружаться прямо во время опроса
+        return (), False
+
+
+def wait_for_images_ready(driver, selector, timeout=DEFAULT_READY_TIMEOUT,
+                          stability_window=DEFAULT_STABILITY_WINDOW, poll_interval=DEFAULT_POLL_INTERVAL):
+    """Ждет, пока набор изображений по selector перестанет меняться.
+
+    Готовность наступает, когда изображения есть, все они загружены
+    (img.complete) и их адреса не менялись stability_window секунд.
+    Вместо фиксированной паузы возвращается сразу после этого.
+    Возвращает число найденных изображений: 0, если за timeout их не
+    появилось; если набор так и не стабилизировался, возвращается то,
+    что есть на момент таймаута.
+    """
+    deadline = time.monotonic() + timeout
+    last_srcs = None
+    stable_since = None
+    while True:
+        srcs, complete = _snapshot(driver, selector)
+        now = time.monotonic()
+        if srcs != last_srcs or not complete or stable_since is None:
+            # Окно стабильности начинается с первого опроса, где изображения есть и все догрузились,
+            # даже если их адреса не изменились с опроса, на котором они еще грузились
+            last_srcs = srcs
+            stable_since = now if (srcs and complete) else None
+        elif now - stable_since >= stability_window:
+            return len(srcs)
+
+        if now >= deadline:
+            return len(srcs)
+        time.sleep(min(poll_interval, max(0.0, deadline - now)))
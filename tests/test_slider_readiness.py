@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from slider_readiness import wait_for_images_ready
+
+
+class FakeDriver:
+    """Отдает заранее заданные снимки [srcs, complete]; последний повторяется бесконечно."""
+
+    def __init__(self, snapshots):
+        self.snapshots = list(snapshots)
+        self.polls = 0
+
+    def execute_script(self, script, selector):
+        snapshot = self.snapshots[min(self.polls, len(self.snapshots) - 1)]
+        self.polls += 1
+        return snapshot
+
+
+class WaitForImagesReadyTest(unittest.TestCase):
+    def test_loading_then_complete_with_same_srcs_returns_after_window(self):
+        srcs = ['a.jpg', 'b.jpg']
+        driver = FakeDriver([[srcs, False], [srcs, False], [srcs, True]])
+        start = time.monotonic()
+        count = wait_for_images_ready(driver, 'img', timeout=3.0, stability_window=0.3, poll_interval=0.05)
+        elapsed = time.monotonic() - start
+        self.assertEqual(count, 2)
+        self.assertLess(elapsed, 1.0)
+
+    def test_changing_srcs_restart_window(self):
+        driver = FakeDriver([[['a.jpg'], True], [['a.jpg', 'b.jpg'], True]])
+        count = wait_for_images_ready(driver, 'img', timeout=3.0, stability_window=0.2, poll_interval=0.05)
+        self.assertEqual(count, 2)
+
+    def test_no_images_waits_until_timeout(self):
+        driver = FakeDriver([[[], True]])
+        start = time.monotonic()
+        count = wait_for_images_ready(driver, 'img', timeout=0.3, stability_window=0.1, poll_interval=0.05)
+        self.assertEqual(count, 0)
+        self.assertGreaterEqual(time.monotonic() - start, 0.3)
+
+
+if __name__ == '__main__':
+    unittest.main()